@@ -2,12 +2,41 @@ import os
 import subprocess
 import sys
 import urllib.request
+import urllib.parse
 import zipfile
+import tarfile
 import shutil
 import hashlib
 import gnupg
+import re
 import time
+import json
+import stat
+import argparse
 import platform
+import http.client
+import http.server
+import statistics
+import gzip
+import threading
+import contextlib
+import ctypes
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    import fcntl  # Not available on Windows; reflinks are Linux-only anyway
+except ImportError:
+    fcntl = None
+
+try:
+    import brotli  # Optional: enables .br sidecars for precompressed assets
+except ImportError:
+    brotli = None
+
+try:
+    import tomllib  # Python 3.11+: TOML instance manifests (JSON always works)
+except ImportError:
+    tomllib = None
 
 """
 ####################################################################################
@@ -74,38 +103,423 @@ def print_colored(message, color=Colors.OKGREEN):
     """Prints a message in the specified color."""
     print(f"{color}{message}{Colors.ENDC}")
 
+# Hex digest length of each checksum algorithm we understand
+DIGEST_LENGTHS = {32: "md5", 40: "sha1", 64: "sha256", 128: "sha512"}
+
+def normalize_fingerprint(fingerprint):
+    """Upper-case hex fingerprint without spaces or a 0x prefix, for comparisons."""
+    fingerprint = str(fingerprint).replace(" ", "").upper()
+    return fingerprint[2:] if fingerprint.startswith("0X") else fingerprint
+
+def published_checksum_url(url):
+    """URL of the checksum file published alongside a prebuilt archive, if its site has one."""
+    for prefix, name in PUBLISHED_CHECKSUMS.items():
+        if url.startswith(prefix):
+            return f"{url.rsplit('/', 1)[0]}/{name}"
+    return None
+
+def component_version(url):
+    """Extract the version number (e.g. '2.4.62') from an Apache or PHP archive URL."""
+    match = re.search(r"(\d+\.\d+\.\d+)", os.path.basename(url))
+    return match.group(1) if match else "unknown"
+
+def guess_digest_algorithm(checksum_name_or_digest):
+    """Guess the hash algorithm from a checksum file name (e.g. 'SHA512SUMS', 'x.zip.sha256') or a hex digest."""
+    name = os.path.basename(checksum_name_or_digest).lower()
+    for algorithm in ("sha512", "sha256", "sha1", "md5"):
+        if algorithm in name:
+            return algorithm
+    if all(c in "0123456789abcdef" for c in name):
+        return DIGEST_LENGTHS.get(len(name))
+    return None
+
+# Cache of extracted archives, keyed by the archive's SHA256
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "ApachePHP")
+
+# ioctl request that clones a whole file (reflink) on Btrfs/XFS and friends
+FICLONE = 0x40049409
+
+# Paths (relative to an extracted tree) the installer or admins edit in place;
+# these are always given their own copy, everything else may be hardlinked
+MUTABLE_PATHS = ("Apache24/conf/", "Apache24/logs/", "conf/", "logs/", "php/php.ini", "php.ini")
+
+# Modules enabled by the static-asset performance profile
+STATIC_PROFILE_MODULES = ("filter", "deflate", "brotli", "headers", "expires", "rewrite", "setenvif",
+                          "cache", "cache_disk", "http2")
+
+# Text assets served precompressed (.br/.gz sidecars) and their media types
+PRECOMPRESSED_TYPES = {
+    "css": "text/css",
+    "js": "text/javascript",
+    "svg": "image/svg+xml",
+    "html": "text/html",
+    "json": "application/json",
+}
+
+# PHP-FPM pool sizing: share of RAM given to PHP workers, and the per-worker RSS
+# assumed until real workers can be measured
+FPM_MEMORY_FRACTION = 0.6
+FPM_DEFAULT_WORKER_RSS = 64 * 1024 * 1024
+
+# Default prebuilt Apache and PHP archives (the PHP module for Apache needs the thread-safe build)
+DEFAULT_APACHE_URL = "https://www.apachelounge.com/download/VS17/binaries/httpd-2.4.62-240904-win64-VS17.zip"
+DEFAULT_PHP_URL = "https://windows.php.net/downloads/releases/archives/php-8.3.12-Win32-vs16-x64.zip"
+
+# Checksum files published next to prebuilt archives, by download location
+PUBLISHED_CHECKSUMS = {"https://windows.php.net/downloads/releases/": "sha256sum.txt"}
+
+# Upstream source releases for the Linux build-from-source mode (checksums and
+# .asc signatures are published next to each tarball). archive.apache.org keeps
+# every release; downloads.apache.org drops them once they are superseded.
+SOURCE_URLS = {
+    "apr": "https://archive.apache.org/dist/apr/apr-1.7.5.tar.gz",
+    "apr-util": "https://archive.apache.org/dist/apr/apr-util-1.6.3.tar.gz",
+    "httpd": "https://archive.apache.org/dist/httpd/httpd-2.4.62.tar.gz",
+    "php": "https://www.php.net/distributions/php-8.3.12.tar.gz",
+}
+
+# Keyrings of each project's release managers; a source tarball's signature must
+# come from one of these keys
+SOURCE_KEYRINGS = {
+    "apr": "https://archive.apache.org/dist/apr/KEYS",
+    "apr-util": "https://archive.apache.org/dist/apr/KEYS",
+    "httpd": "https://archive.apache.org/dist/httpd/KEYS",
+    "php": "https://www.php.net/distributions/php-keyring.gpg",
+}
+
+# Source builds: baseline compiler flags, the PHP extensions compiled in (everything
+# else is left out), and the memory one parallel compile job may need
+SOURCE_CFLAGS = "-O2 -pipe"
+PHP_SOURCE_EXTENSIONS = ("--disable-all", "--enable-opcache", "--enable-session", "--enable-filter", "--enable-ctype",
+                         "--enable-tokenizer", "--enable-fileinfo", "--enable-pdo", "--with-pdo-mysql=mysqlnd",
+                         "--with-mysqli=mysqlnd", "--with-openssl", "--with-zlib")
+BUILD_MEMORY_PER_JOB = 1024 * 1024 * 1024
+
+# Tarball suffixes and their compression; "" is an uncompressed tar
+TAR_COMPRESSIONS = {".tar.gz": "gz", ".tgz": "gz", ".tar.xz": "xz", ".txz": "xz",
+                    ".tar.bz2": "bz2", ".tbz2": "bz2", ".tar": ""}
+
+# Multi-threaded external decompressors, in order of preference; tarfile's own
+# single-threaded decompression is the fallback
+DECOMPRESSORS = {
+    "gz": (["pigz", "-dc"],),
+    "xz": (["xz", "-dc", "-T0"],),
+    "bz2": (["lbzip2", "-dc"], ["pbzip2", "-dc"]),
+}
+
+# Upstream hosts the serve-cache proxy fetches from (extend with --allow-host), and
+# where PGP keys can be fetched over plain HTTPS (and thus through the proxy)
+PROXY_ALLOWED_HOSTS = ("downloads.apache.org", "dlcdn.apache.org", "archive.apache.org", "www.apachelounge.com",
+                       "www.php.net", "windows.php.net", "keys.openpgp.org")
+PGP_KEY_URL = "https://keys.openpgp.org/vks/v1/by-fingerprint/{fingerprint}"
+
+# Low-impact mode: default read bandwidth cap for verification, and the
+# ioprio_set(2) syscall used to move the process to the idle I/O class.
+# These and lower_priority()/IOThrottle are deliberately duplicated in
+# verify_ubuntu.py: each script is shipped and run on its own.
+LOW_IMPACT_MAX_RATE = 50 * 1024 * 1024
+IOPRIO_SYSCALLS = {"x86_64": 251, "aarch64": 30, "i686": 289, "armv7l": 314}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+
+# Prewarm: extra static asset types requested besides PRECOMPRESSED_TYPES, how many
+# URLs and rounds at most, the median latency change (between rounds) that counts
+# as stable, and how much of DocumentRoot may be read into the page cache
+PREWARM_ASSET_TYPES = ("png", "jpg", "jpeg", "gif", "webp", "ico", "woff", "woff2")
+PREWARM_MAX_URLS = 500
+PREWARM_MAX_ROUNDS = 5
+PREWARM_STABLE_CHANGE = 0.1
+PREWARM_TOUCH_LIMIT = 512 * 1024 * 1024
+
+# Sources smaller than this are not worth precompressing
+PRECOMPRESS_MIN_SIZE = 256
+
+# Paths (relative to a release) the running server writes to; left out of audit manifests
+AUDIT_EXCLUDED_PATHS = ("Apache24/logs/",)
+
+def lower_priority():
+    """Run at nice 10 and, on Linux, in the idle I/O class so the node's services win any contention.
+
+    Threads and processes started afterwards inherit both settings. Returns the previous
+    (niceness, I/O priority) so they can be given back to processes that must not keep them.
+    """
+    niceness = ioprio = None
+    if hasattr(os, "nice"):
+        niceness = os.getpriority(os.PRIO_PROCESS, 0)
+        os.nice(10)
+    syscall_number = IOPRIO_SYSCALLS.get(platform.machine())
+    if platform.system() == "Linux" and syscall_number:
+        libc = ctypes.CDLL(None, use_errno=True)
+        ioprio = libc.syscall(syscall_number + 1, IOPRIO_WHO_PROCESS, 0)  # ioprio_get follows ioprio_set
+        if libc.syscall(syscall_number, IOPRIO_WHO_PROCESS, 0, IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT) != 0:
+            print_colored(f"Could not lower the I/O priority: {os.strerror(ctypes.get_errno())}", Colors.WARNING)
+            ioprio = None
+    return niceness, (ioprio if ioprio is not None and ioprio >= 0 else None)
+
+# Priority the installer had before --low-impact lowered it; services get it back
+_service_priority = None
+
+def service_command(command):
+    """Prefix a (sudo) service command so the service runs at the priority lower_priority() took away.
+
+    An unprivileged process cannot raise its own priority again, so nice/ionice run
+    after sudo, as root, and the service inherits the restored settings from them.
+    """
+    if not _service_priority or os.name != "posix":
+        return list(command)
+    niceness, ioprio = _service_priority
+    restore = []
+    if niceness is not None and niceness != os.getpriority(os.PRIO_PROCESS, 0):
+        restore += ["nice", "-n", str(niceness - os.getpriority(os.PRIO_PROCESS, 0))]  # nice -n is relative
+    if ioprio is not None and shutil.which("ionice"):
+        io_class = ioprio >> IOPRIO_CLASS_SHIFT
+        restore += ["ionice", "-c", str(io_class)] + (["-n", str(ioprio & 0xff)] if io_class in (1, 2) else [])
+    command = list(command)
+    at = 1 if command[:1] == ["sudo"] else 0
+    return command[:at] + restore + command[at:]
+
+def service_run(command):
+    """subprocess.run for commands that start a long-running service (at normal priority)."""
+    return subprocess.run(service_command(command), check=True)
+
+class IOThrottle:
+    """Token bucket capping read bandwidth, backing off while reads get slower than usual.
+
+    A rise in per-MB read latency means something else is using the disk, so the
+    rate drops towards min_rate; it recovers towards max_rate once reads are fast again.
+    Safe to share between reader threads.
+    """
+
+    def __init__(self, max_rate=LOW_IMPACT_MAX_RATE, min_rate=None):
+        self.max_rate = max_rate
+        self.min_rate = min_rate or max_rate / 16
+        self.rate = max_rate
+        self.tokens = 0.0
+        self.last = time.monotonic()
+        self.baseline = None  # Recent best per-MB read latency
+        self.latency = None   # Smoothed per-MB read latency
+        self.bytes = 0
+        self.read_time = 0.0
+        self.slept = 0.0
+        self.lock = threading.Lock()
+
+    def consume(self, nbytes, latency):
+        """Account for a read of nbytes that took latency seconds, sleeping to honour the rate."""
+        with self.lock:
+            self.bytes += nbytes
+            self.read_time += latency
+            if nbytes:
+                sample = latency * 1024 * 1024 / nbytes
+                # The baseline creeps up so one page-cache hit does not pin it forever
+                self.baseline = sample if self.baseline is None else min(sample, self.baseline * 1.05)
+                self.latency = sample if self.latency is None else 0.8 * self.latency + 0.2 * sample
+                if self.latency > 2 * self.baseline:
+                    self.rate = max(self.min_rate, self.rate * 0.7)
+                else:
+                    self.rate = min(self.max_rate, self.rate * 1.05)
+            now = time.monotonic()
+            self.tokens = min(self.tokens + (now - self.last) * self.rate, self.rate) - nbytes
+            self.last = now
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            if wait:
+                self.tokens = 0.0
+                self.last = now + wait
+                self.slept += wait
+        if wait:
+            time.sleep(wait)
+
+    def report(self, label):
+        """Print how much throttling slowed this work and how much disk read time it left to others.
+
+        The share left to others is the time spent yielding out of the time spent
+        reading plus yielding: the reads would otherwise have run back to back.
+        """
+        if not self.bytes:
+            return
+        throttled = self.read_time + self.slept
+        unthrottled = self.bytes / max(self.read_time, 1e-6)
+        print_colored(f"Low-impact {label}: {self.bytes / (1024 * 1024):.0f} MB read at "
+                      f"{self.bytes / max(throttled, 1e-6) / (1024 * 1024):.1f} MB/s (unthrottled reads: "
+                      f"{unthrottled / (1024 * 1024):.1f} MB/s, final cap {self.rate / (1024 * 1024):.1f} MB/s), "
+                      f"{self.slept:.1f}s spent yielding; ~{self.slept / max(throttled, 1e-6):.0%} of the disk's "
+                      f"read time left to other processes.", Colors.OKCYAN)
+
+def tar_compression(url):
+    """Compression of a tarball URL ("" for a plain tar), or None if it is not a tarball."""
+    name = os.path.basename(url).lower()
+    for suffix, compression in TAR_COMPRESSIONS.items():
+        if name.endswith(suffix):
+            return compression
+    return None
+
+def stream_extract(source, dest, compression, hashes, tee_path=None, chunk_size=1024 * 1024):
+    """Extract a tarball into dest while it is still being read from source (e.g. an HTTP response).
+
+    A feeder thread reads source, updates hashes and optionally copies the raw bytes to
+    tee_path, while this thread decompresses and writes members one at a time, so download,
+    decompression and writes overlap and memory use stays bounded. Needs tarfile.data_filter
+    (Python 3.12, or a 3.8-3.11 security release), since members reach the disk before
+    the archive is verified.
+    """
+    command = next((c for c in DECOMPRESSORS.get(compression, ()) if shutil.which(c[0])), None)
+    if command:
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        sink, tar_source, mode = process.stdin, process.stdout, "r|"
+    else:
+        process = None
+        read_fd, write_fd = os.pipe()
+        sink, tar_source = os.fdopen(write_fd, "wb"), os.fdopen(read_fd, "rb")
+        mode = f"r|{compression}" if compression else "r|"
+    print_colored(f"Decompressing with {command[0] if command else 'tarfile'}.", Colors.OKCYAN)
+
+    errors = []
+    def feed():
+        try:
+            with (open(tee_path, "wb") if tee_path else contextlib.nullcontext()) as tee:
+                for chunk in iter(lambda: source.read(chunk_size), b""):
+                    for digest in hashes.values():
+                        digest.update(chunk)
+                    if tee:
+                        tee.write(chunk)
+                    sink.write(chunk)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            try:
+                sink.close()
+            except OSError:
+                pass  # The reading side is gone; its error is reported instead
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        with tarfile.open(fileobj=tar_source, mode=mode) as tar_ref:
+            # Members are not verified yet: the data filter rejects absolute paths, '..' and links out of dest
+            tar_ref.extractall(dest, filter="data")
+        # Consume trailing padding so the whole download is hashed
+        while tar_source.read(chunk_size):
+            pass
+    finally:
+        tar_source.close()
+        feeder.join()
+        if process:
+            process.wait()
+    if errors:
+        raise errors[0]
+    if process and process.returncode != 0:
+        raise Exception(f"{command[0]} exited with status {process.returncode}")
+
+def reflink_file(src, dst):
+    """Share src's blocks with a new dst (copy-on-write); returns False where the filesystem can't."""
+    if fcntl is None:
+        return False
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            reflinked = False
+        else:
+            reflinked = True
+    if not reflinked:
+        os.remove(dst)
+        return False
+    shutil.copymode(src, dst)
+    return True
+
+def clone_file(src, dst, reflink=True):
+    """Copy a file as cheaply as the filesystem allows: reflink, then copy_file_range, then a plain copy.
+
+    Returns the method that was used.
+    """
+    if reflink and reflink_file(src, dst):
+        return "reflink"
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        if hasattr(os, "copy_file_range"):
+            try:
+                while os.copy_file_range(fsrc.fileno(), fdst.fileno(), 64 * 1024 * 1024):
+                    pass
+                shutil.copymode(src, dst)
+                return "copy_file_range"
+            except OSError:
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+        shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+    shutil.copymode(src, dst)
+    return "copy"
+
 class Downloader:
-    def __init__(self):
-        pass
+    def __init__(self, mirror=None, throttle=None):
+        # Base URL of a serve-cache proxy to try before going upstream
+        self.mirror = mirror.rstrip("/") if mirror else None
+        # IOThrottle pacing checksum reads in low-impact mode
+        self.throttle = throttle
+
+    def urlopen(self, url, via_mirror=False):
+        """Open url, through the mirror (falling back to upstream) if via_mirror is set and one is configured.
 
-    def download_file(self, url, dest):
+        The mirror is plain HTTP and unauthenticated, so only content that is verified
+        afterwards (archives, pinned keys) may come through it; the checksum and signature
+        files that verify it always come from upstream.
+        """
+        if self.mirror and via_mirror:
+            try:
+                return urllib.request.urlopen(f"{self.mirror}/{url}", timeout=60)
+            except OSError as e:
+                print_colored(f"Mirror {self.mirror} failed for {url} ({e}); using upstream.", Colors.WARNING)
+        return urllib.request.urlopen(url, timeout=60)
+
+    def download_file(self, url, dest, via_mirror=False):
         """Download a file from a URL with retries."""
         def download():
             print_colored(f"Downloading {url}...", Colors.OKCYAN)
-            urllib.request.urlretrieve(url, dest)
+            with self.urlopen(url, via_mirror) as response, open(dest, "wb") as f:
+                shutil.copyfileobj(response, f, 1024 * 1024)
             if not os.path.exists(dest):
                 raise Exception(f"Failed to download {url}")
             print_colored(f"Downloaded to {dest}", Colors.OKGREEN)
         self.retry(download)
 
-    def verify_checksum(self, file_path, expected_checksum):
-        """Verify the SHA256 checksum of a downloaded file."""
-        print_colored(f"Verifying checksum for {file_path}...", Colors.OKCYAN)
-        sha256 = hashlib.sha256()
+    def verify_checksum(self, file_path, expected_checksum, algorithm=None):
+        """Verify the checksum of a downloaded file (SHA256 unless another algorithm is given or implied)."""
+        algorithm = algorithm or guess_digest_algorithm(expected_checksum) or "sha256"
+        return self.verify_checksums(file_path, {algorithm: expected_checksum})
+
+    def verify_checksums(self, file_path, expected_checksums):
+        """Verify several digests ({algorithm: hexdigest}) of a file in a single read pass."""
+        print_colored(f"Verifying {', '.join(expected_checksums)} checksum(s) for {file_path}...", Colors.OKCYAN)
+        hashes = {algorithm: hashlib.new(algorithm) for algorithm in expected_checksums}
         try:
             with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    sha256.update(chunk)
-            calculated_checksum = sha256.hexdigest()
-            if calculated_checksum == expected_checksum:
-                print_colored(f"Checksum verification passed for {file_path}.", Colors.OKGREEN)
-                return True
-            else:
-                print_colored(f"Checksum verification failed for {file_path}. Expected {expected_checksum}, got {calculated_checksum}.", Colors.FAIL)
-                return False
+                while True:
+                    read_start = time.monotonic()
+                    chunk = f.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    if self.throttle:
+                        self.throttle.consume(len(chunk), time.monotonic() - read_start)
+                    for digest in hashes.values():
+                        digest.update(chunk)
         except FileNotFoundError:
             print_colored(f"File {file_path} not found for checksum verification.", Colors.FAIL)
             return False
+        if self.throttle:
+            self.throttle.report("checksum verification so far")
+        return self.check_digests(file_path, hashes, expected_checksums)
+
+    def check_digests(self, file_path, hashes, expected_checksums):
+        """Compare computed hash objects against the expected hex digests."""
+        passed = True
+        for algorithm, digest in hashes.items():
+            calculated_checksum = digest.hexdigest()
+            expected_checksum = expected_checksums[algorithm].lower()
+            if calculated_checksum == expected_checksum:
+                print_colored(f"{algorithm.upper()} checksum verification passed for {file_path}.", Colors.OKGREEN)
+            else:
+                print_colored(f"{algorithm.upper()} checksum verification failed for {file_path}. Expected {expected_checksum}, got {calculated_checksum}.", Colors.FAIL)
+                passed = False
+        return passed
 
     def retry(self, func, retries=3, delay=5):
         """Retry a function call with specified retries and delay."""
@@ -119,26 +533,58 @@ class Downloader:
         sys.exit(1)
 
 class PGPHandler:
-    def __init__(self):
+    def __init__(self, downloader=None):
         self.gpg = gnupg.GPG()
+        self.downloader = downloader or Downloader()
+        self.keyrings = {}  # Keyring URL -> fingerprints imported from it
 
     def download_pgp_key(self, fingerprint):
         """Download the PGP key from a keyserver using its fingerprint with retries."""
         def download_key():
             print_colored(f"Downloading PGP key with fingerprint {fingerprint}...", Colors.OKCYAN)
-            keyserver = "hkps://keys.openpgp.org"  # You can use another keyserver if needed
-            result = self.gpg.recv_keys(keyserver, fingerprint)
+            if self.downloader.mirror:
+                # The keyserver's HTTPS interface can be cached by a serve-cache mirror; HKPS cannot
+                with self.downloader.urlopen(PGP_KEY_URL.format(fingerprint=fingerprint), via_mirror=True) as response:
+                    imported = self.gpg.import_keys(response.read())
+                # The mirror is plain HTTP: only accept the key that was asked for
+                result = normalize_fingerprint(fingerprint) in [normalize_fingerprint(f) for f in imported.fingerprints]
+            else:
+                keyserver = "hkps://keys.openpgp.org"  # You can use another keyserver if needed
+                result = self.gpg.recv_keys(keyserver, fingerprint)
             if not result:
                 raise Exception(f"Failed to download PGP key with fingerprint {fingerprint}")
             print_colored(f"Successfully downloaded PGP key with fingerprint {fingerprint}.", Colors.OKGREEN)
-        Downloader().retry(download_key)
+        self.downloader.retry(download_key)
+
+    def import_keyring(self, keyring_url):
+        """Import a project's release-manager keyring, returning the fingerprints it holds.
+
+        Always fetched straight from upstream over HTTPS, never through a mirror.
+        """
+        if keyring_url not in self.keyrings:
+            def download_keyring():
+                print_colored(f"Importing release signing keys from {keyring_url}...", Colors.OKCYAN)
+                with urllib.request.urlopen(keyring_url, timeout=60) as response:
+                    fingerprints = self.gpg.import_keys(response.read()).fingerprints
+                if not fingerprints:
+                    raise Exception(f"No keys found in {keyring_url}")
+                return fingerprints
+            self.keyrings[keyring_url] = self.downloader.retry(download_keyring)
+        return self.keyrings[keyring_url]
 
-    def verify_pgp(self, file_path, pgp_file):
-        """Verify the PGP signature of a downloaded file."""
+    def verify_pgp(self, file_path, pgp_file, fingerprints=None):
+        """Verify the PGP signature of a downloaded file, made by one of fingerprints if given."""
         print_colored(f"Verifying PGP signature for {file_path}...", Colors.OKCYAN)
         with open(pgp_file, "rb") as sig_file:
             with open(file_path, "rb") as target_file:
                 verified = self.gpg.verify_file(sig_file, file_path)
+                if verified and fingerprints:
+                    # Any key in the keyring verifies; the signer must be one we expect
+                    expected = {normalize_fingerprint(f) for f in fingerprints if f}
+                    signers = {normalize_fingerprint(f) for f in (verified.fingerprint, getattr(verified, "pubkey_fingerprint", None)) if f}
+                    if not expected & signers:
+                        print_colored(f"PGP signature for {file_path} was made by an unexpected key ({verified.fingerprint}).", Colors.FAIL)
+                        return False
                 if verified:
                     print_colored(f"PGP signature verification passed for {file_path}.", Colors.OKGREEN)
                     return True
@@ -146,31 +592,961 @@ class PGPHandler:
                     print_colored(f"PGP signature verification failed for {file_path}.", Colors.FAIL)
                     return False
 
+class ArtifactCache:
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.trees_dir = os.path.join(cache_dir, "trees")
+        self.index_file = os.path.join(cache_dir, "urls.json")
+
+    def tree_path(self, digest):
+        """Path of the extracted tree for an archive digest."""
+        return os.path.join(self.trees_dir, digest)
+
+    def load_index(self):
+        try:
+            with open(self.index_file, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def lookup(self, url):
+        """Return the digest of a previously extracted archive for this URL, if its tree is still cached."""
+        digest = self.load_index().get(url)
+        if digest and os.path.isdir(self.tree_path(digest)):
+            return digest
+        return None
+
+    def remember(self, url, digest):
+        """Record which archive digest a URL resolved to."""
+        index = self.load_index()
+        index[url] = digest
+        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+        with open(f"{self.index_file}.tmp", "w") as f:
+            json.dump(index, f, indent=1)
+        os.replace(f"{self.index_file}.tmp", self.index_file)
+
+    def is_mutable(self, relative_path):
+        return relative_path.replace(os.sep, "/").startswith(MUTABLE_PATHS)
+
+    def extract(self, archive_path, url=None):
+        """Extract an archive into the cache once and return its digest."""
+        sha256 = hashlib.sha256()
+        with open(archive_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        tree = self.tree_path(digest)
+
+        if not os.path.isdir(tree):
+            staging = f"{tree}.tmp-{os.getpid()}"
+            shutil.rmtree(staging, ignore_errors=True)
+            if zipfile.is_zipfile(archive_path):
+                with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+                    zip_ref.extractall(staging)
+            else:
+                # Source releases are tarballs
+                with tarfile.open(archive_path, "r:*") as tar_ref:
+                    tar_ref.extractall(staging, **({"filter": "data"} if hasattr(tarfile, "data_filter") else {}))
+            return self.commit(staging, digest, url)
+        if url:
+            self.remember(url, digest)
+        return digest
+
+    def staging_path(self):
+        """A scratch directory next to the trees for an extraction whose digest is not known yet."""
+        return os.path.join(self.trees_dir, f".incoming-{os.getpid()}-{threading.get_ident()}")
+
+    def commit(self, staging, digest, url=None):
+        """Seal an extracted staging directory and move it into place as the tree for digest."""
+        tree = self.tree_path(digest)
+        if os.path.isdir(tree):
+            shutil.rmtree(staging)  # Another install extracted the same archive meanwhile
+        else:
+            self.seal(staging)
+            os.replace(staging, tree)
+        if url:
+            self.remember(url, digest)
+        return digest
+
+    def seal(self, tree):
+        """Make shared files read-only so a hardlinked install cannot modify the cache."""
+        for root, _, files in os.walk(tree):
+            for name in files:
+                path = os.path.join(root, name)
+                if not os.path.islink(path) and not self.is_mutable(os.path.relpath(path, tree)):
+                    os.chmod(path, stat.S_IMODE(os.stat(path).st_mode) & ~0o222)
+
+    def materialize(self, digest, dest):
+        """Populate dest from a cached tree using reflinks, hardlinks or cheap copies.
+
+        Reflinks come first: they are as cheap as hardlinks but copy-on-write, so an edit
+        in the release (e.g. bin/envvars) can never reach back into the cache.
+        """
+        tree = self.tree_path(digest)
+        methods = {}
+        for root, dirs, files in os.walk(tree):
+            relative_root = os.path.relpath(root, tree)
+            target_root = os.path.normpath(os.path.join(dest, relative_root))
+            os.makedirs(target_root, exist_ok=True)
+            for name in files:
+                src = os.path.join(root, name)
+                dst = os.path.join(target_root, name)
+                if os.path.lexists(dst):
+                    os.remove(dst)
+                method = "reflink" if reflink_file(src, dst) else None
+                if method is None and not self.is_mutable(os.path.relpath(src, tree)):
+                    try:
+                        os.link(src, dst)
+                        method = "hardlink"
+                    except OSError:
+                        pass  # Different filesystem or no hardlink support
+                if method is None:
+                    method = clone_file(src, dst, reflink=False)
+                methods[method] = methods.get(method, 0) + 1
+        summary = ", ".join(f"{count} {method}" for method, count in sorted(methods.items()))
+        print_colored(f"Materialized {dest} from cache ({summary or 'no files'}).", Colors.OKGREEN)
+        return methods
+
+class SourceBuilder:
+    def __init__(self, artifact_cache, optimizations=()):
+        self.artifact_cache = artifact_cache
+        self.work_dir = os.path.join(CACHE_DIR, "build")
+        self.optimizations = sorted(optimizations)  # Any of "lto", "pgo"
+
+    def compile_flags(self):
+        return f"{SOURCE_CFLAGS} -flto=auto" if "lto" in self.optimizations else SOURCE_CFLAGS
+
+    def build_key(self, source_digests):
+        """Digest of everything that determines the build output: sources, flags and options."""
+        inputs = {
+            "sources": source_digests,
+            "cflags": self.compile_flags(),
+            "optimizations": self.optimizations,
+            "php": PHP_SOURCE_EXTENSIONS,
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    def build_jobs(self):
+        """Parallel make jobs: one per core, as long as each job still has enough memory."""
+        cores = os.cpu_count() or 1
+        per_job = BUILD_MEMORY_PER_JOB * (2 if "lto" in self.optimizations else 1)
+        try:
+            with open("/proc/meminfo", "r") as meminfo:
+                available = next(int(line.split()[1]) * 1024 for line in meminfo if line.startswith("MemAvailable:"))
+        except (OSError, StopIteration, ValueError):
+            return cores
+        return max(1, min(cores, available // per_job))
+
+    def build_env(self):
+        env = dict(os.environ, CFLAGS=self.compile_flags(), CXXFLAGS=self.compile_flags())
+        if "lto" in self.optimizations:
+            env.update(LDFLAGS="-flto=auto", AR="gcc-ar", RANLIB="gcc-ranlib")
+        if shutil.which("ccache"):
+            # Paths are rewritten relative to the work dir, so rebuilds under another key still hit
+            env.update(CC=f"ccache {env.get('CC', 'cc')}", CXX=f"ccache {env.get('CXX', 'c++')}",
+                       CCACHE_BASEDIR=self.work_dir, CCACHE_NOHASHDIR="1")
+        return env
+
+    def run_step(self, command, cwd, env):
+        print_colored(f"[{os.path.basename(cwd)}] {' '.join(command)}", Colors.OKCYAN)
+        subprocess.run(command, cwd=cwd, env=env, check=True)
+
+    def unpack(self, digest, dest):
+        """Copy a cached source tree (minus its top-level directory) into a writable build directory."""
+        tree = self.artifact_cache.tree_path(digest)
+        entries = os.listdir(tree)
+        source = os.path.join(tree, entries[0]) if len(entries) == 1 else tree
+        shutil.copytree(source, dest, symlinks=True, copy_function=clone_file)
+        for root, _, files in os.walk(dest):
+            for name in files:
+                path = os.path.join(root, name)
+                if not os.path.islink(path):
+                    os.chmod(path, stat.S_IMODE(os.stat(path).st_mode) | stat.S_IWUSR)
+
+    def build(self, source_digests):
+        """Build APR, APR-util, httpd and PHP into a cached tree, returning its digest.
+
+        The tree holds Apache24/ and php/ like the prebuilt archives and is reused as
+        long as the sources and build options are unchanged.
+        """
+        key = self.build_key(source_digests)
+        tree = self.artifact_cache.tree_path(key)
+        build_info = os.path.join(tree, "build-info.json")
+        if os.path.exists(build_info):
+            print_colored(f"Using cached source build {key[:12]}.", Colors.OKBLUE)
+            return key
+
+        # Binaries embed their install prefix, so build straight into the final tree;
+        # build-info.json is written last and marks it complete
+        shutil.rmtree(tree, ignore_errors=True)
+        build_dir = os.path.join(self.work_dir, key)
+        shutil.rmtree(build_dir, ignore_errors=True)
+        for name, digest in source_digests.items():
+            self.unpack(digest, os.path.join(build_dir, name))
+
+        apache_prefix = os.path.join(tree, "Apache24")
+        php_prefix = os.path.join(tree, "php")
+        jobs = self.build_jobs()
+        make = ["make", f"-j{jobs}"]
+        env = self.build_env()
+        started = time.time()
+        print_colored(f"Building from source with {jobs} jobs (CFLAGS={env['CFLAGS']}, "
+                      f"ccache {'on' if 'CCACHE_BASEDIR' in env else 'off'}).", Colors.OKCYAN)
+        try:
+            configure_steps = [
+                ("apr", []),
+                ("apr-util", [f"--with-apr={apache_prefix}"]),
+                ("httpd", [f"--with-apr={apache_prefix}", f"--with-apr-util={apache_prefix}",
+                           "--enable-mods-shared=reallyall", "--enable-mpms-shared=all"]),
+            ]
+            for name, options in configure_steps:
+                source_dir = os.path.join(build_dir, name)
+                self.run_step(["./configure", f"--prefix={apache_prefix}", *options], source_dir, env)
+                self.run_step(make, source_dir, env)
+                self.run_step(["make", "install"], source_dir, env)
+
+            php_source = os.path.join(build_dir, "php")
+            self.run_step(["./configure", f"--prefix={php_prefix}", f"--with-apxs2={apache_prefix}/bin/apxs",
+                           "--enable-fpm", *PHP_SOURCE_EXTENSIONS], php_source, env)
+            if "pgo" in self.optimizations:
+                # Instrumented build, a training run on PHP's own benchmark, then the optimized build
+                self.run_step(make + ["prof-gen"], php_source, env)
+                self.run_step(["sapi/cli/php", "-n", "Zend/bench.php"], php_source, env)
+                self.run_step(["make", "prof-clean"], php_source, env)
+                self.run_step(make + ["prof-use"], php_source, env)
+            else:
+                self.run_step(make, php_source, env)
+            # INSTALL_IT is the apxs step that would edit httpd.conf; the module goes next to PHP instead
+            self.run_step(["make", "install", "INSTALL_IT=:"], php_source, env)
+        except (subprocess.CalledProcessError, OSError) as e:
+            print_colored(f"Source build failed: {e}", Colors.FAIL)
+            shutil.rmtree(tree, ignore_errors=True)
+            sys.exit(1)
+
+        shutil.copy2(os.path.join(php_source, "libs", "libphp.so"), os.path.join(php_prefix, "libphp.so"))
+        if not os.path.exists(os.path.join(php_prefix, "php.ini")):
+            shutil.copy2(os.path.join(php_source, "php.ini-production"), os.path.join(php_prefix, "php.ini"))
+        self.artifact_cache.seal(tree)
+        with open(build_info, "w") as f:
+            json.dump({"sources": source_digests, "cflags": env["CFLAGS"], "optimizations": self.optimizations,
+                       "jobs": jobs, "seconds": round(time.time() - started)}, f, indent=1)
+        shutil.rmtree(build_dir, ignore_errors=True)
+        print_colored(f"Source build {key[:12]} finished in {time.time() - started:.0f}s.", Colors.OKGREEN)
+        return key
+
+def precompress_file(path, known_digest, known_sidecars, suffixes):
+    """Worker: (re)write the compressed sidecars of one asset unless its content is unchanged.
+
+    known_sidecars lists the suffixes written last time (a sidecar that would not be
+    smaller than its source is not written). Returns (path, digest, written suffixes, action).
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    if digest == known_digest and all(os.path.exists(path + suffix) for suffix in known_sidecars):
+        # Same content, new mtime (e.g. a fresh checkout): keep the sidecars, mark them current
+        for suffix in known_sidecars:
+            os.utime(path + suffix)
+        return path, digest, known_sidecars, "unchanged"
+
+    written = []
+    for suffix in suffixes:
+        sidecar = path + suffix
+        if suffix == ".gz":
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        else:
+            compressed = brotli.compress(data, quality=11)
+        if len(compressed) >= len(data):
+            # Not worth serving; make sure a stale sidecar does not linger
+            if os.path.exists(sidecar):
+                os.remove(sidecar)
+            continue
+        with open(f"{sidecar}.tmp", "wb") as f:
+            f.write(compressed)
+        os.replace(f"{sidecar}.tmp", sidecar)
+        written.append(suffix)
+    return path, digest, written, "compressed"
+
+class Precompressor:
+    def __init__(self, document_root, cache_dir=CACHE_DIR, workers=None):
+        self.document_root = os.path.abspath(document_root)
+        root_id = hashlib.sha256(self.document_root.encode()).hexdigest()[:16]
+        self.state_file = os.path.join(cache_dir, "precompress", f"{root_id}.json")
+        self.workers = workers
+        self.suffixes = [".gz"] + ([".br"] if brotli else [])
+
+    def load_state(self):
+        try:
+            with open(self.state_file, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self, state):
+        os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+        with open(f"{self.state_file}.tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(f"{self.state_file}.tmp", self.state_file)
+
+    def is_compressible(self, path):
+        return path.rsplit(".", 1)[-1].lower() in PRECOMPRESSED_TYPES
+
+    def run(self):
+        """Write .gz (and .br) sidecars for changed assets and remove stale ones."""
+        if not os.path.isdir(self.document_root):
+            print_colored(f"DocumentRoot {self.document_root} does not exist.", Colors.FAIL)
+            sys.exit(1)
+        if not brotli:
+            print_colored("Python 'brotli' module not installed; writing .gz sidecars only.", Colors.WARNING)
+        start = time.monotonic()
+        state = self.load_state()
+        new_state, pending, orphans = {}, [], []
+
+        for root, _, files in os.walk(self.document_root):
+            for name in files:
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, self.document_root)
+                if not self.is_compressible(name):
+                    continue  # Including .gz/.br sidecars, ours or the site's
+                info = os.stat(path)
+                if info.st_size < PRECOMPRESS_MIN_SIZE:
+                    continue
+                known = state.get(relative, {})
+                known_sidecars = known.get("sidecars", [])
+                sidecars_current = all(os.path.exists(path + s) and os.stat(path + s).st_mtime_ns >= info.st_mtime_ns
+                                       for s in known_sidecars)
+                if (sidecars_current and known.get("suffixes") == self.suffixes
+                        and known.get("size") == info.st_size and known.get("mtime_ns") == info.st_mtime_ns):
+                    new_state[relative] = known  # Fast path: nothing changed since the last run
+                    continue
+                # brotli became available (or went away): recompress even if the content is the same
+                known_digest = known.get("sha256") if known.get("suffixes") == self.suffixes else None
+                pending.append((path, relative, known_digest, known_sidecars))
+
+        counts = {"compressed": 0, "unchanged": 0}
+        if pending:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                futures = {pool.submit(precompress_file, path, digest, known_sidecars, self.suffixes): relative
+                           for path, relative, digest, known_sidecars in pending}
+                for future, relative in futures.items():
+                    path, digest, written, action = future.result()
+                    info = os.stat(path)
+                    new_state[relative] = {"size": info.st_size, "mtime_ns": info.st_mtime_ns, "sha256": digest,
+                                           "sidecars": written, "suffixes": self.suffixes}
+                    counts[action] += 1
+
+        # Only sidecars we wrote are ours to remove; other .gz/.br files belong to the site
+        for relative, known in state.items():
+            source = os.path.join(self.document_root, relative)
+            # Its source is gone or now too small to precompress: the sidecars would serve stale content
+            if relative not in new_state:
+                for suffix in known.get("sidecars", []):
+                    if os.path.exists(source + suffix):
+                        os.remove(source + suffix)
+                        orphans.append(source + suffix)
+        self.save_state(new_state)
+
+        skipped = len(new_state) - counts["compressed"] - counts["unchanged"]
+        print_colored(f"Precompressed {counts['compressed']} asset(s), {counts['unchanged'] + skipped} unchanged, "
+                      f"{len(orphans)} stale sidecar(s) removed in {time.monotonic() - start:.1f}s.", Colors.OKGREEN)
+        return counts
+
+def hash_install_file(path):
+    """Worker: SHA256 of one installed file."""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return path, sha256.hexdigest()
+
+class InstallAuditor:
+    def __init__(self, install_dir, workers=None):
+        self.releases_dir = os.path.join(install_dir, "releases")
+        self.manifest_dir = os.path.join(install_dir, "audit")
+        self.workers = workers
+
+    def manifest_path(self, release_name):
+        return os.path.join(self.manifest_dir, f"{release_name}.json")
+
+    def load_manifest(self, release_name):
+        try:
+            with open(self.manifest_path(release_name), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_manifest(self, release_name, manifest):
+        os.makedirs(self.manifest_dir, exist_ok=True)
+        path = self.manifest_path(release_name)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(f"{path}.tmp", path)
+
+    def scan(self, release_dir):
+        """Yield (relative path, path, lstat) for every file and symlink of a release."""
+        for root, dirs, files in os.walk(release_dir):
+            dirs.sort()
+            for name in sorted(files) + [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, release_dir).replace(os.sep, "/")
+                if not relative.startswith(AUDIT_EXCLUDED_PATHS):
+                    yield relative, path, os.lstat(path)
+
+    def stat_entry(self, info):
+        # ctime cannot be set from userspace, so a content change hidden behind a restored mtime still shows
+        return {"size": info.st_size, "mtime_ns": info.st_mtime_ns, "ctime_ns": info.st_ctime_ns,
+                "mode": stat.S_IMODE(info.st_mode)}
+
+    def hash_files(self, paths):
+        """SHA256 of each path, computed across a process pool."""
+        if not paths:
+            return {}
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            return dict(pool.map(hash_install_file, paths, chunksize=32))
+
+    def record(self, release_dir):
+        """Write the audit manifest of a release: stat metadata and content digest of every file."""
+        start = time.monotonic()
+        release_name = os.path.basename(os.path.normpath(release_dir))
+        manifest, regular = {}, {}
+        for relative, path, info in self.scan(release_dir):
+            manifest[relative] = self.stat_entry(info)
+            if stat.S_ISLNK(info.st_mode):
+                manifest[relative]["link"] = os.readlink(path)
+            else:
+                regular[path] = relative
+        for path, digest in self.hash_files(list(regular)).items():
+            manifest[regular[path]]["sha256"] = digest
+        self.save_manifest(release_name, manifest)
+        print_colored(f"Recorded audit manifest of {release_name} ({len(manifest)} files) "
+                      f"in {time.monotonic() - start:.1f}s.", Colors.OKGREEN)
+        return manifest
+
+    def audit(self, release_dir, deep=False):
+        """Compare a release with its manifest; returns {relative path: problem}, or None without a manifest.
+
+        Files whose size, mtime, ctime and mode match the manifest are trusted without
+        reading them unless deep is set; the rest are hashed, and the manifest's stat
+        metadata is refreshed for those whose content turns out unchanged.
+        """
+        release_name = os.path.basename(os.path.normpath(release_dir))
+        manifest = self.load_manifest(release_name)
+        if manifest is None:
+            print_colored(f"No audit manifest for {release_name}; run 'audit --record' to create one.", Colors.WARNING)
+            return None
+        start = time.monotonic()
+        problems, pending, seen = {}, {}, set()
+        for relative, path, info in self.scan(release_dir):
+            seen.add(relative)
+            known = manifest.get(relative)
+            if known is None:
+                problems[relative] = "added"
+            elif stat.S_ISLNK(info.st_mode) or "link" in known:
+                if not stat.S_ISLNK(info.st_mode) or os.readlink(path) != known.get("link"):
+                    problems[relative] = "link changed"
+            elif stat.S_IMODE(info.st_mode) != known["mode"]:
+                problems[relative] = f"mode changed ({known['mode']:o} -> {stat.S_IMODE(info.st_mode):o})"
+            elif info.st_size != known["size"]:
+                problems[relative] = "modified"
+            elif deep or self.stat_entry(info) != {key: known[key] for key in ("size", "mtime_ns", "ctime_ns", "mode")}:
+                pending[path] = relative
+        for relative in manifest.keys() - seen:
+            problems[relative] = "missing"
+
+        refreshed = 0
+        for path, digest in self.hash_files(list(pending)).items():
+            relative = pending[path]
+            if digest != manifest[relative]["sha256"]:
+                problems[relative] = "modified"
+            elif self.stat_entry(os.lstat(path)) != {key: manifest[relative][key] for key in ("size", "mtime_ns", "ctime_ns", "mode")}:
+                # Same content, new metadata (e.g. a hardlink added by another release): trust it next time
+                manifest[relative].update(self.stat_entry(os.lstat(path)))
+                refreshed += 1
+        if refreshed:
+            self.save_manifest(release_name, manifest)
+
+        for relative in sorted(problems):
+            print_colored(f"  {relative}: {problems[relative]}", Colors.FAIL)
+        summary = (f"{release_name}: {len(seen)} file(s), {len(pending)} hashed, {len(problems)} problem(s) "
+                   f"in {time.monotonic() - start:.1f}s.")
+        print_colored(summary, Colors.FAIL if problems else Colors.OKGREEN)
+        return problems
+
+    def run(self, release_name=None, deep=False, record=False):
+        """Audit (or with record, re-record) a named release or every installed one; exits 1 on drift."""
+        releases = [release_name] if release_name else sorted(
+            name for name in os.listdir(self.releases_dir) if not name.startswith(".")) if os.path.isdir(self.releases_dir) else []
+        if not releases or not all(os.path.isdir(os.path.join(self.releases_dir, name)) for name in releases):
+            print_colored("No release to audit.", Colors.FAIL)
+            sys.exit(1)
+        drift = False
+        for name in releases:
+            release_dir = os.path.join(self.releases_dir, name)
+            if record:
+                self.record(release_dir)
+            else:
+                drift = bool(self.audit(release_dir, deep)) or drift
+        if drift:
+            sys.exit(1)
+
+class Prewarmer:
+    def __init__(self, document_root, apache_port, workers=8):
+        self.document_root = os.path.abspath(document_root)
+        self.apache_port = int(apache_port)
+        self.workers = workers
+
+    def discover_urls(self, url_list=None):
+        """Return (path, host) pairs to request: from a URL list or sitemap, or by walking DocumentRoot.
+
+        Only index.php files and PHP scripts at the top of DocumentRoot count as entry
+        points; other PHP files are usually includes that should not be run directly.
+        """
+        if url_list:
+            if url_list.startswith(("http://", "https://")):
+                with urllib.request.urlopen(url_list, timeout=30) as response:
+                    text = response.read().decode("utf-8", "replace")
+            else:
+                with open(url_list, "r") as f:
+                    text = f.read()
+            # A sitemap lists URLs in <loc> elements; anything else is one URL or path per line
+            entries = re.findall(r"<loc>\s*([^<\s]+)\s*</loc>", text) or [line.strip() for line in text.splitlines()]
+            urls = []
+            for entry in entries:
+                if not entry or entry.startswith("#"):
+                    continue
+                parts = urllib.parse.urlsplit(entry)
+                path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+                urls.append((path, parts.netloc or None))
+            return urls[:PREWARM_MAX_URLS]
+
+        urls = []
+        for root, dirs, files in os.walk(self.document_root):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            for name in sorted(files):
+                extension = name.rsplit(".", 1)[-1].lower()
+                top_level = root == self.document_root
+                if extension == "php" and not (name == "index.php" or top_level):
+                    continue
+                if extension != "php" and extension not in PRECOMPRESSED_TYPES and extension not in PREWARM_ASSET_TYPES:
+                    continue
+                relative = os.path.relpath(os.path.join(root, name), self.document_root).replace(os.sep, "/")
+                if name == "index.php":
+                    relative = relative[:-len("index.php")]  # Request the directory, as clients do
+                urls.append(("/" + relative, None))
+                if len(urls) >= PREWARM_MAX_URLS:
+                    return urls
+        return urls
+
+    def touch_files(self, limit=PREWARM_TOUCH_LIMIT):
+        """Read DocumentRoot's files into the page cache (like vmtouch -t), up to limit bytes."""
+        touched = 0
+        start = time.monotonic()
+        for root, _, files in os.walk(self.document_root):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    size = os.path.getsize(path)
+                    if touched + size > limit:
+                        continue
+                    with open(path, "rb", buffering=0) as f:
+                        if hasattr(os, "posix_fadvise"):
+                            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                        while f.read(1024 * 1024):
+                            pass
+                    touched += size
+                except OSError:
+                    continue
+        print_colored(f"Read {touched / (1024 * 1024):.1f} MB of DocumentRoot into the page cache "
+                      f"in {time.monotonic() - start:.1f}s.", Colors.OKCYAN)
+        return touched
+
+    def request(self, path, host=None):
+        """GET path from the local server, returning (status, seconds)."""
+        start = time.monotonic()
+        connection = http.client.HTTPConnection("localhost", self.apache_port, timeout=30)
+        try:
+            headers = {"Accept-Encoding": "br, gzip", "User-Agent": "ApachePHP-prewarm"}
+            if host:
+                headers["Host"] = host  # Keep name-based virtual hosts working
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status, time.monotonic() - start
+        except OSError:
+            return None, time.monotonic() - start
+        finally:
+            connection.close()
+
+    def run(self, url_list=None, touch=False, max_rounds=PREWARM_MAX_ROUNDS):
+        """Request every URL in rounds until the median latency settles; report cold vs warm latency."""
+        if touch:
+            self.touch_files()
+        urls = self.discover_urls(url_list)
+        if not urls:
+            print_colored("Nothing to prewarm.", Colors.WARNING)
+            return {}
+        print_colored(f"Prewarming {len(urls)} URL(s) on port {self.apache_port} with {self.workers} concurrent requests...", Colors.OKCYAN)
+        latencies = {url: [] for url in urls}
+        statuses = {}
+        previous_median = None
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for round_number in range(1, max_rounds + 1):
+                for url, (status, seconds) in zip(urls, pool.map(lambda url: self.request(*url), urls)):
+                    latencies[url].append(seconds)
+                    statuses[url] = status
+                median = statistics.median(samples[-1] for samples in latencies.values())
+                print_colored(f"  round {round_number}: median {median * 1000:.1f} ms", Colors.OKCYAN)
+                if previous_median is not None and abs(previous_median - median) <= PREWARM_STABLE_CHANGE * previous_median:
+                    break
+                previous_median = median
+
+        # Slowest cold URLs first: these are what the first real users would have paid for
+        for url in sorted(urls, key=lambda url: latencies[url][0], reverse=True)[:20]:
+            samples = latencies[url]
+            print_colored(f"  {url[0]:<50} {statuses[url] or 'error'}  cold {samples[0] * 1000:7.1f} ms  "
+                          f"warm {samples[-1] * 1000:7.1f} ms", Colors.OKBLUE)
+        failed = [url for url in urls if not statuses[url] or statuses[url] >= 500]
+        cold = statistics.median(samples[0] for samples in latencies.values())
+        warm = statistics.median(samples[-1] for samples in latencies.values())
+        print_colored(f"Prewarm done: median latency {cold * 1000:.1f} ms cold, {warm * 1000:.1f} ms warm"
+                      f"{f', {len(failed)} URL(s) failed' if failed else ''}.", Colors.WARNING if failed else Colors.OKGREEN)
+        return latencies
+
+class CacheProxy:
+    def __init__(self, cache_dir=CACHE_DIR, allowed_hosts=PROXY_ALLOWED_HOSTS):
+        self.store_dir = os.path.join(cache_dir, "proxy")
+        self.allowed_hosts = set(allowed_hosts)
+        self.lock = threading.Lock()
+        self.in_flight = {}  # URL -> Event set when its upstream fetch ends
+
+    def store_path(self, url):
+        return os.path.join(self.store_dir, hashlib.sha256(url.encode()).hexdigest())
+
+    def is_allowed(self, url):
+        parts = urllib.parse.urlsplit(url)
+        return parts.scheme in ("http", "https") and parts.hostname in self.allowed_hosts
+
+    def fetch(self, url):
+        """Return (path, status) of the cached copy of url, fetching it upstream once.
+
+        Concurrent misses for the same URL are collapsed: one request fetches, the
+        others wait for it and are served from the cache.
+        """
+        path = self.store_path(url)
+        with self.lock:
+            if os.path.exists(path):
+                return path, "hit"
+            event = self.in_flight.get(url)
+            leader = event is None
+            if leader:
+                event = self.in_flight[url] = threading.Event()
+        if not leader:
+            event.wait()
+            if os.path.exists(path):
+                return path, "collapsed"
+            raise Exception(f"Upstream fetch of {url} failed")
+
+        temp_path = f"{path}.tmp-{threading.get_ident()}"
+        try:
+            os.makedirs(self.store_dir, exist_ok=True)
+            with urllib.request.urlopen(url, timeout=60) as response, open(temp_path, "wb") as f:
+                shutil.copyfileobj(response, f, 1024 * 1024)
+            os.replace(temp_path, path)
+            return path, "miss"
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            with self.lock:
+                del self.in_flight[url]
+            event.set()
+
+    def serve(self, bind="0.0.0.0", port=8090):
+        """Serve cached artifacts at http://<bind>:<port>/<upstream URL> until interrupted."""
+        server = http.server.ThreadingHTTPServer((bind, port), CacheProxyHandler)
+        server.daemon_threads = True
+        server.proxy = self
+        print_colored(f"Serving the artifact cache on http://{bind}:{port}/ (store: {self.store_dir}).", Colors.OKGREEN)
+        print_colored(f"Use it with: --mirror http://<this host>:{port}", Colors.OKCYAN)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print_colored("Stopping cache server.", Colors.WARNING)
+        finally:
+            server.server_close()
+
+class CacheProxyHandler(http.server.BaseHTTPRequestHandler):
+    """GET/HEAD /<upstream URL>, answered from the proxy's store (with single Range requests)."""
+
+    def do_HEAD(self):
+        self.do_GET(send_body=False)
+
+    def do_GET(self, send_body=True):
+        proxy = self.server.proxy
+        url = self.path[1:]
+        if not proxy.is_allowed(url):
+            self.send_error(403, "Upstream host not allowed")
+            return
+        try:
+            path, self.cache_status = proxy.fetch(url)
+        except urllib.error.HTTPError as e:
+            self.send_error(e.code)
+            return
+        except Exception as e:
+            self.send_error(502, str(e))
+            return
+
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))  # Suffix range: the last N bytes
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("X-Cache", self.cache_status)
+        self.end_headers()
+        if send_body:
+            with open(path, "rb") as f:
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining:
+                    chunk = f.read(min(remaining, 1024 * 1024))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+
+    def log_message(self, format, *args):
+        status = getattr(self, "cache_status", "-")
+        print_colored(f"{self.client_address[0]} [{status}] {format % args}", Colors.OKBLUE)
+
+class PHPFPMConfigurator:
+    def __init__(self, php_dir, os_type, run_dir):
+        self.php_dir = php_dir
+        self.os_type = os_type
+        self.socket_path = os.path.join(run_dir, "php-fpm.sock")
+        self.pid_file = os.path.join(run_dir, "php-fpm.pid")
+        # Command line the running master was started with; USR2 re-executes exactly that
+        self.command_file = os.path.join(run_dir, "php-fpm.command")
+
+    def fpm_binary(self):
+        """The php-fpm binary of the PHP tree, or one on PATH."""
+        bundled = os.path.join(self.php_dir, "sbin", "php-fpm")
+        return bundled if os.path.exists(bundled) else shutil.which("php-fpm") or bundled
+
+    def total_memory(self):
+        """Physical memory in bytes (Linux and macOS)."""
+        try:
+            if self.os_type == "Darwin":
+                return int(subprocess.run(["sysctl", "-n", "hw.memsize"], capture_output=True, text=True).stdout)
+            with open("/proc/meminfo", "r") as meminfo:
+                for line in meminfo:
+                    if line.startswith("MemTotal:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError):
+            pass
+        return 2 * 1024 * 1024 * 1024
+
+    def master_pid(self):
+        try:
+            with open(self.pid_file, "r") as f:
+                pid = int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+        try:
+            os.kill(pid, 0)
+        except PermissionError:
+            pass  # A root-owned master we may not signal, but it exists
+        except OSError:
+            return None
+        return pid
+
+    def running_command(self):
+        try:
+            with open(self.command_file, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def stop(self, timeout=60):
+        """Gracefully stop the PHP-FPM master (QUIT lets workers finish their requests)."""
+        master = self.master_pid()
+        if master is None:
+            return
+        try:
+            subprocess.run(["sudo", "kill", "-QUIT", str(master)], check=True)
+        except subprocess.CalledProcessError as e:
+            print_colored(f"Failed to stop PHP-FPM: {e}", Colors.FAIL)
+            sys.exit(1)
+        deadline = time.monotonic() + timeout
+        while self.master_pid() is not None and time.monotonic() < deadline:
+            time.sleep(0.5)
+        if self.master_pid() is not None:
+            print_colored(f"PHP-FPM master {master} did not exit within {timeout}s.", Colors.FAIL)
+            sys.exit(1)
+        print_colored("PHP-FPM stopped.", Colors.OKGREEN)
+
+    def measure_worker_rss(self):
+        """Average RSS of the running pool's workers, or the default estimate if none are running."""
+        master = self.master_pid()
+        if master is None:
+            return FPM_DEFAULT_WORKER_RSS
+        result = subprocess.run(["ps", "-ax", "-o", "pid=,ppid=,rss="], capture_output=True, text=True)
+        sizes = [int(rss) * 1024 for pid, ppid, rss in (line.split() for line in result.stdout.splitlines() if line.strip())
+                 if int(ppid) == master]
+        return max(sum(sizes) // len(sizes), 16 * 1024 * 1024) if sizes else FPM_DEFAULT_WORKER_RSS
+
+    def render(self, php_ini, user, pm="dynamic", group=None):
+        """Render php-fpm.conf with a pool sized from memory and per-worker RSS."""
+        worker_rss = self.measure_worker_rss()
+        max_children = max(2, int(self.total_memory() * FPM_MEMORY_FRACTION // worker_rss))
+        print_colored(f"PHP-FPM pool: pm = {pm}, pm.max_children = {max_children} "
+                      f"({worker_rss // (1024 * 1024)} MB per worker).", Colors.OKCYAN)
+        lines = [
+            "[global]",
+            f"pid = {self.pid_file}",
+            "daemonize = yes",
+            "",
+            "[www]",
+            f"user = {user}",
+            f"group = {group or user}",
+            f"listen = {self.socket_path}",
+            f"listen.owner = {user}",
+            f"listen.group = {group or user}",
+            "listen.mode = 0660",
+            f"pm = {pm}",
+            f"pm.max_children = {max_children}",
+        ]
+        if pm == "dynamic":
+            lines += [
+                f"pm.start_servers = {max(1, max_children // 4)}",
+                f"pm.min_spare_servers = {max(1, max_children // 8)}",
+                f"pm.max_spare_servers = {max(2, max_children // 2)}",
+            ]
+        else:
+            lines.append("pm.process_idle_timeout = 10s")
+        lines += [
+            "pm.max_requests = 1000",
+            f"php_admin_value[error_log] = {os.path.join(os.path.dirname(self.pid_file), 'php-fpm.log')}",
+            "",
+        ]
+        return "\n".join(lines)
+
+    def reconcile(self, fpm_conf, php_ini):
+        """Test the pool configuration, then start PHP-FPM or gracefully reload it."""
+        command = ["sudo", self.fpm_binary(), "-y", fpm_conf, "-c", php_ini]
+        result = subprocess.run(command + ["-t"], capture_output=True, text=True)
+        if result.returncode != 0:
+            print_colored(f"PHP-FPM configuration test failed:\n{result.stderr.strip()}", Colors.FAIL)
+            sys.exit(1)
+        try:
+            master = self.master_pid()
+            if master and self.running_command() != command:
+                # USR2 re-executes the original argv, so a new -c php.ini needs a fresh master
+                print_colored("PHP-FPM command line changed; restarting the master process.", Colors.WARNING)
+                self.stop()
+                master = None
+            if master:
+                # USR2 re-executes the master and replaces workers gracefully
+                subprocess.run(["sudo", "kill", "-USR2", str(master)], check=True)
+                print_colored("PHP-FPM gracefully reloaded.", Colors.OKGREEN)
+            else:
+                service_run(command)
+                with open(self.command_file, "w") as f:
+                    json.dump(command, f)
+                print_colored("PHP-FPM started successfully.", Colors.OKGREEN)
+        except subprocess.CalledProcessError as e:
+            print_colored(f"Failed to start PHP-FPM: {e}", Colors.FAIL)
+            sys.exit(1)
+
 class ApacheConfigurator:
-    def __init__(self, apache_dir, php_dir, os_type):
+    def __init__(self, apache_dir, php_dir, os_type, pid_file=None):
         self.apache_dir = apache_dir
         self.php_dir = php_dir
         self.os_type = os_type
+        self.pid_file = pid_file
+        run_dir = os.path.dirname(pid_file) if pid_file else os.path.join(apache_dir, "logs")
+        self.fpm = PHPFPMConfigurator(php_dir, os_type, run_dir)
+
+    def configure(self, apache_port, document_root, php_ini, httpd_conf=None, static_profile=False, php_mode="module",
+                  fpm_pm="dynamic"):
+        """Configure Apache to work with PHP and use the specified settings.
 
-    def configure(self, apache_port, document_root, php_ini):
-        """Configure Apache to work with PHP and use the specified settings."""
-        httpd_conf = os.path.join(self.apache_dir, "conf", "httpd.conf")
+        httpd_conf defaults to the one under apache_dir; pass another path to render
+        the configuration into a release that is not live yet. static_profile adds
+        compression, caching headers, a disk cache, sendfile and HTTP/2 tuning.
+        php_mode "fpm" (Linux/MacOS) runs PHP in a PHP-FPM pool behind mpm_event and
+        mod_proxy_fcgi instead of loading it into Apache; the PHP module needs mpm_prefork.
+        fpm_pm is the pool's process manager: "dynamic" keeps spare workers warm,
+        "ondemand" forks them per request burst and suits rarely used sites.
+        """
+        httpd_conf = httpd_conf or os.path.join(self.apache_dir, "conf", "httpd.conf")
+        server_root = self.apache_dir.replace("\\", "/")
+        fpm_conf = os.path.join(os.path.dirname(httpd_conf), "php-fpm.conf")
+        if php_mode == "fpm" and self.os_type == "Windows":
+            print_colored("PHP-FPM is not available on Windows; using the PHP Apache module.", Colors.WARNING)
+            php_mode = "module"
+        if fpm_pm not in ("dynamic", "ondemand"):
+            print_colored(f"Unknown PHP-FPM process manager '{fpm_pm}'; use 'dynamic' or 'ondemand'.", Colors.FAIL)
+            sys.exit(1)
 
-        # Backup the original httpd.conf
+        # Backup the original httpd.conf once; it stays the template so reconfiguring is repeatable
         try:
-            shutil.copyfile(httpd_conf, f"{httpd_conf}.backup")
+            if not os.path.exists(f"{httpd_conf}.backup"):
+                clone_file(httpd_conf, f"{httpd_conf}.backup")
         except IOError as e:
             print_colored(f"Failed to backup httpd.conf: {e}", Colors.FAIL)
             sys.exit(1)
 
         # Update httpd.conf with user-specified port, DocumentRoot, and PHP configuration
         try:
-            with open(httpd_conf, "r") as conf_file:
+            with open(f"{httpd_conf}.backup", "r") as conf_file:
                 config_lines = conf_file.readlines()
 
+            # Which MPM is loaded decides whether HTTP/2 can be enabled
+            mpm = "winnt" if self.os_type == "Windows" else None
+            for line in config_lines:
+                match = re.match(r"LoadModule\s+mpm_(\w+)_module\s", line.strip())
+                if match:
+                    mpm = match.group(1)
+            if php_mode == "fpm":
+                mpm = "event"  # No PHP in-process, so the threaded event MPM is safe
+            elif mpm not in (None, "winnt", "prefork") and any(
+                    re.match(r"#?\s*LoadModule\s+mpm_prefork_module\s", line.strip()) for line in config_lines):
+                mpm = "prefork"  # mod_php is built without thread safety and refuses threaded MPMs
+            wanted_modules = [m for m in STATIC_PROFILE_MODULES if m != "http2" or mpm not in (None, "prefork")] if static_profile else []
+            if mpm in ("event", "prefork"):
+                wanted_modules.append(f"mpm_{mpm}")
+            if php_mode == "fpm":
+                wanted_modules += ["proxy", "proxy_fcgi"]
+
             with open(httpd_conf, "w") as conf_file:
                 for line in config_lines:
-                    if line.strip().startswith("Listen "):
+                    module = re.match(r"#\s*LoadModule\s+(\w+)_module\s", line.strip())
+                    active_mpm = re.match(r"LoadModule\s+mpm_(\w+)_module\s", line.strip())
+                    if module and module.group(1) in wanted_modules:
+                        conf_file.write(line.replace("#", "", 1).lstrip())  # Enable a stock module we need
+                    elif active_mpm and active_mpm.group(1) != mpm:
+                        conf_file.write(f"#{line}")  # Only one MPM may be loaded
+                    elif line.strip().startswith("ServerRoot "):
+                        conf_file.write(f'ServerRoot "{server_root}"\n')  # Resolve paths through apache_dir
+                    elif line.strip().startswith("Define SRVROOT "):
+                        conf_file.write(f'Define SRVROOT "{server_root}"\n')
+                    elif line.strip().startswith("PidFile ") and self.pid_file:
+                        continue  # Replaced by the shared PidFile below
+                    elif line.strip().startswith("Listen "):
                         conf_file.write(f"Listen {apache_port}\n")  # Set user-specified port
                     elif line.strip().startswith("<VirtualHost _default_:80>"):
                         conf_file.write(f"<VirtualHost _default_:{apache_port}>\n")  # Set user-specified port
@@ -181,19 +1557,161 @@ class ApacheConfigurator:
                     else:
                         conf_file.write(line)
 
-                # Add PHP module and handler configuration
-                php_module_line = self.get_php_module_line()
-                conf_file.write("\n# PHP Configuration\n")
-                conf_file.write(php_module_line)
-                conf_file.write(f"AddHandler application/x-httpd-php .php\n")
-                conf_file.write(f"PHPIniDir \"{os.path.dirname(php_ini)}\"\n")
-                conf_file.write("DirectoryIndex index.php index.html\n")
+                if php_mode == "fpm":
+                    # Hand PHP requests to the PHP-FPM pool; keep-alive connections no longer pin a PHP worker
+                    conf_file.write("\n# PHP Configuration (PHP-FPM)\n")
+                    conf_file.write('<FilesMatch "\\.php$">\n')
+                    conf_file.write(f'    SetHandler "proxy:unix:{self.fpm.socket_path}|fcgi://localhost"\n')
+                    conf_file.write("</FilesMatch>\n")
+                    conf_file.write("DirectoryIndex index.php index.html\n")
+                else:
+                    # Add PHP module and handler configuration
+                    php_module_line = self.get_php_module_line()
+                    conf_file.write("\n# PHP Configuration\n")
+                    conf_file.write(php_module_line)
+                    conf_file.write(f"AddHandler application/x-httpd-php .php\n")
+                    conf_file.write(f"PHPIniDir \"{os.path.dirname(php_ini)}\"\n")
+                    conf_file.write("DirectoryIndex index.php index.html\n")
+
+                # Keep the PID file outside any single release so every tree can signal the running server
+                if self.pid_file:
+                    os.makedirs(os.path.dirname(self.pid_file), exist_ok=True)
+                    conf_file.write(f'PidFile "{self.pid_file}"\n')
+
+                if static_profile:
+                    conf_file.write(self.render_static_profile(document_root, mpm))
+
+            # The pool configuration lives next to httpd.conf so it switches with the release
+            if php_mode == "fpm":
+                user = self.get_directive("User", httpd_conf) or ("_www" if self.os_type == "Darwin" else "daemon")
+                group = self.get_directive("Group", httpd_conf) or user
+                with open(fpm_conf, "w") as f:
+                    f.write(self.fpm.render(php_ini, user, fpm_pm, group))
+            elif os.path.exists(fpm_conf):
+                os.remove(fpm_conf)
 
             print_colored(f"Apache configured to use PHP, listen on port {apache_port}, and serve content from {document_root}.", Colors.OKGREEN)
         except IOError as e:
             print_colored(f"Failed to configure Apache: {e}", Colors.FAIL)
             sys.exit(1)
 
+    def render_static_profile(self, document_root, mpm):
+        """Render the static-asset performance profile block of httpd.conf."""
+        extensions = "|".join(PRECOMPRESSED_TYPES)
+        compressible = "text/html text/plain text/css text/javascript application/javascript application/json image/svg+xml application/xml"
+        state_dir = os.path.dirname(self.pid_file) if self.pid_file else os.path.join(self.apache_dir, "logs")
+        cache_root = os.path.join(state_dir, "cache").replace("\\", "/")
+        os.makedirs(cache_root, exist_ok=True)
+
+        lines = [
+            "\n# Static Asset Performance Profile",
+            "EnableSendfile On",
+            "EnableMMAP On",
+            "",
+            "# Serve precompressed .br/.gz sidecars when the client accepts them",
+            f'<Directory "{document_root}">',
+            "    <IfModule mod_rewrite.c>",
+            "        RewriteEngine On",
+        ]
+        for encoding, suffix in (("br", "br"), ("gzip", "gz")):
+            lines += [
+                f'        RewriteCond "%{{HTTP:Accept-Encoding}}" "{encoding}"',
+                f'        RewriteCond "%{{REQUEST_FILENAME}}.{suffix}" -s',
+                f'        RewriteRule "^(.+\\.({extensions}))$" "$1.{suffix}" [QSA]',
+            ]
+        for extension, media_type in PRECOMPRESSED_TYPES.items():
+            lines.append(f'        RewriteRule "\\.{extension}\\.(br|gz)$" "-" [T={media_type},E=no-gzip:1,E=no-brotli:1]')
+        lines += [
+            "    </IfModule>",
+            "    <IfModule mod_headers.c>",
+            f'        <FilesMatch "\\.({extensions})\\.br$">',
+            "            Header set Content-Encoding br",
+            "            Header append Vary Accept-Encoding",
+            "        </FilesMatch>",
+            f'        <FilesMatch "\\.({extensions})\\.gz$">',
+            "            Header set Content-Encoding gzip",
+            "            Header append Vary Accept-Encoding",
+            "        </FilesMatch>",
+            "    </IfModule>",
+            "</Directory>",
+            "<IfModule mod_mime.c>",
+            "    RemoveLanguage .br",
+            "</IfModule>",
+            "",
+            "# On-the-fly compression for everything else (brotli first, gzip as fallback)",
+            "<IfModule mod_brotli.c>",
+            f"    AddOutputFilterByType BROTLI_COMPRESS {compressible}",
+            "    BrotliCompressionQuality 5",
+            "</IfModule>",
+            "<IfModule mod_deflate.c>",
+            f"    AddOutputFilterByType DEFLATE {compressible}",
+            "    DeflateCompressionLevel 6",
+            "</IfModule>",
+            "",
+            "# Client-side caching by media type",
+            "<IfModule mod_expires.c>",
+            "    ExpiresActive On",
+            '    ExpiresByType text/css "access plus 1 year"',
+            '    ExpiresByType text/javascript "access plus 1 year"',
+            '    ExpiresByType application/javascript "access plus 1 year"',
+            '    ExpiresByType font/woff2 "access plus 1 year"',
+            '    ExpiresByType image/svg+xml "access plus 1 month"',
+            '    ExpiresByType image/png "access plus 1 month"',
+            '    ExpiresByType image/jpeg "access plus 1 month"',
+            '    ExpiresByType image/gif "access plus 1 month"',
+            '    ExpiresByType image/webp "access plus 1 month"',
+            '    ExpiresByType text/html "access plus 0 seconds"',
+            '    ExpiresByType application/json "access plus 0 seconds"',
+            "</IfModule>",
+            "<IfModule mod_headers.c>",
+            '    <FilesMatch "\\.(css|js|woff2|svg|png|jpe?g|gif|webp)$">',
+            '        Header merge Cache-Control "public"',
+            "    </FilesMatch>",
+            "</IfModule>",
+            "",
+            "# Disk cache for dynamic responses that mark themselves cacheable (Cache-Control max-age/s-maxage)",
+            "<IfModule mod_cache_disk.c>",
+            f'    CacheRoot "{cache_root}"',
+            '    CacheEnable disk "/"',
+            "    CacheDirLevels 2",
+            "    CacheDirLength 1",
+            "    CacheQuickHandler Off",
+            "    CacheIgnoreHeaders Set-Cookie",
+            "    CacheLock On",
+            "    <IfModule mod_setenvif.c>",
+            '        SetEnvIf Request_URI "\\.(css|js|svg|png|jpe?g|gif|webp|woff2|br|gz)$" no-cache',
+            "    </IfModule>",
+            "</IfModule>",
+        ]
+        if mpm not in (None, "prefork"):
+            lines += [
+                "",
+                f"# HTTP/2 (the {mpm} MPM supports it)",
+                "<IfModule mod_http2.c>",
+                "    Protocols h2 h2c http/1.1",
+                "</IfModule>",
+            ]
+        else:
+            lines += ["", "# HTTP/2 left disabled: it needs a threaded MPM (event/worker), not prefork"]
+        return "\n".join(lines) + "\n"
+
+    def check_static_profile(self, apache_port, path="/"):
+        """Request a URL locally and report the compression and caching headers the profile should produce."""
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", int(apache_port), timeout=10)
+            connection.request("GET", path, headers={"Accept-Encoding": "br, gzip"})
+            response = connection.getresponse()
+            response.read()
+            headers = {name.lower(): value for name, value in response.getheaders()}
+            connection.close()
+        except (OSError, http.client.HTTPException) as e:
+            print_colored(f"Static profile check of {path} failed: {e}", Colors.WARNING)
+            return None
+        print_colored(f"Static profile check of {path}: HTTP {response.status}", Colors.OKCYAN)
+        for header in ("content-encoding", "vary", "cache-control", "expires", "upgrade"):
+            print_colored(f"  {header}: {headers.get(header, '-')}", Colors.OKCYAN)
+        return headers
+
     def get_php_module_line(self):
         """Get the appropriate PHP module line based on the OS."""
         if self.os_type == "Windows":
@@ -203,20 +1721,166 @@ class ApacheConfigurator:
         else:  # Linux
             return f"LoadModule php_module \"{self.php_dir}/libphp.so\"\n"
 
+    def apache_command(self, *args):
+        """Build an httpd command line rooted at apache_dir (so a symlinked tree resolves on every reload)."""
+        apache_exe = os.path.join(self.apache_dir, "bin", "httpd.exe" if self.os_type == "Windows" else "httpd")
+        command = [apache_exe, "-d", self.apache_dir, *args]
+        return command if self.os_type == "Windows" else ["sudo", *command]
+
+    def get_directive(self, name, httpd_conf=None):
+        """Return the value of the first active directive with this name in httpd.conf, if any."""
+        httpd_conf = httpd_conf or os.path.join(self.apache_dir, "conf", "httpd.conf")
+        try:
+            with open(httpd_conf, "r") as conf_file:
+                for line in conf_file:
+                    parts = line.strip().split(None, 1)
+                    if len(parts) == 2 and parts[0] == name:
+                        return parts[1].strip().strip('"')
+        except OSError:
+            pass
+        return None
+
+    def config_hash(self, php_ini=None):
+        """Hash of the rendered configuration, the trees it resolves to and the php.ini PHP-FPM is started with."""
+        sha256 = hashlib.sha256()
+        for name in ("httpd.conf", "php-fpm.conf"):
+            path = os.path.join(self.apache_dir, "conf", name)
+            if os.path.exists(path):
+                with open(path, "rb") as conf_file:
+                    sha256.update(conf_file.read())
+        # The same text can point at a different release through `current`
+        sha256.update(os.path.realpath(self.apache_dir).encode())
+        sha256.update(os.path.realpath(self.php_dir).encode())
+        if php_ini and os.path.exists(os.path.join(self.apache_dir, "conf", "php-fpm.conf")):
+            sha256.update(php_ini.encode())  # Passed to php-fpm with -c, not part of php-fpm.conf
+        return sha256.hexdigest()
+
+    def applied_config_file(self):
+        state_dir = os.path.dirname(self.pid_file) if self.pid_file else os.path.join(self.apache_dir, "logs")
+        return os.path.join(state_dir, "applied-config.sha256")
+
+    def applied_config_hash(self):
+        """Hash of the configuration the running server was last (re)started with."""
+        try:
+            with open(self.applied_config_file(), "r") as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def configtest(self):
+        """Run httpd -t and abort if the configuration is invalid."""
+        result = subprocess.run(self.apache_command("-t"), capture_output=True, text=True)
+        if result.returncode != 0:
+            print_colored(f"Apache configuration test failed:\n{result.stderr.strip()}", Colors.FAIL)
+            sys.exit(1)
+        print_colored("Apache configuration test passed.", Colors.OKGREEN)
+
+    def wait_until_ready(self, apache_port, timeout=30):
+        """Poll the port with exponential backoff until Apache answers HTTP, reporting time-to-ready."""
+        start = time.monotonic()
+        delay = 0.05
+        while True:
+            try:
+                connection = http.client.HTTPConnection("127.0.0.1", int(apache_port), timeout=2)
+                connection.request("HEAD", "/")
+                connection.getresponse()
+                connection.close()
+                print_colored(f"Apache is ready on port {apache_port} after {time.monotonic() - start:.2f}s.", Colors.OKGREEN)
+                return True
+            except (OSError, http.client.HTTPException):
+                if time.monotonic() - start + delay > timeout:
+                    print_colored(f"Apache did not become ready on port {apache_port} within {timeout}s.", Colors.FAIL)
+                    return False
+                time.sleep(delay)
+                delay = min(delay * 2, 1.0)
+
+    def reconcile(self, apache_port, php_ini=None, full_restart=False):
+        """Bring the running server in line with the rendered configuration.
+
+        Does nothing when the configuration is unchanged and Apache is running;
+        otherwise tests it once, then reloads gracefully (or starts Apache), so
+        in-flight connections drain instead of being dropped.
+        """
+        php_ini = php_ini or os.path.join(self.php_dir, "php.ini")
+        desired_hash = self.config_hash(php_ini)
+        running = self.is_running()
+        if running and not full_restart and desired_hash == self.applied_config_hash():
+            print_colored("Apache configuration unchanged; nothing to reload.", Colors.OKBLUE)
+            return False
+
+        self.configtest()
+        # In FPM mode the pool has to be up (or reloaded) before Apache proxies to it
+        fpm_conf = os.path.join(self.apache_dir, "conf", "php-fpm.conf")
+        fpm_mode = os.path.exists(fpm_conf)
+        if fpm_mode:
+            self.fpm.reconcile(fpm_conf, php_ini)
+        if running and full_restart:
+            self.stop_apache()
+            running = False
+        if running:
+            self.graceful_restart()
+        else:
+            self.start_apache()
+        if not self.wait_until_ready(apache_port):
+            sys.exit(1)  # Not recorded as applied, so the next run reloads again
+        if not fpm_mode:
+            self.fpm.stop()  # Back in module mode: nothing proxies to the pool any more
+        with open(self.applied_config_file(), "w") as f:
+            f.write(desired_hash)
+        return True
+
+    def service_installed(self):
+        """Check whether the Apache Windows service is registered."""
+        result = subprocess.run(["sc", "query", "Apache2.4"], capture_output=True, text=True)
+        return result.returncode == 0
+
     def start_apache(self):
         """Start Apache HTTP Server."""
-        apache_exe = os.path.join(self.apache_dir, "bin", "httpd.exe" if self.os_type == "Windows" else "httpd")
         try:
-            if self.os_type == "Windows":
-                subprocess.run([apache_exe, "-k", "install"], check=True)
-                subprocess.run([apache_exe, "-k", "start"], check=True)
-            else:
-                subprocess.run(["sudo", apache_exe, "-k", "start"], check=True)
+            if self.os_type == "Windows" and not self.service_installed():
+                subprocess.run(self.apache_command("-k", "install"), check=True)
+            service_run(self.apache_command("-k", "start"))
             print_colored("Apache HTTP Server started successfully.", Colors.OKGREEN)
         except subprocess.CalledProcessError as e:
             print_colored(f"Failed to start Apache: {e}", Colors.FAIL)
             sys.exit(1)
 
+    def is_running(self):
+        """Check whether the Apache instance managed here is running."""
+        if self.os_type == "Windows":
+            result = subprocess.run(["sc", "query", "Apache2.4"], capture_output=True, text=True)
+            return "RUNNING" in result.stdout
+        try:
+            with open(self.pid_file or os.path.join(self.apache_dir, "logs", "httpd.pid"), "r") as f:
+                os.kill(int(f.read().strip()), 0)
+            return True
+        except PermissionError:
+            return True  # Running as root; we may not signal it but it exists
+        except (OSError, ValueError):
+            return False
+
+    def graceful_restart(self):
+        """Reload the configuration, letting in-flight requests finish on the old workers."""
+        try:
+            # The Windows service has no graceful mode; -k restart is its equivalent
+            # A graceful restart starts Apache if it is not running
+            service_run(self.apache_command("-k", "restart" if self.os_type == "Windows" else "graceful"))
+            print_colored("Apache HTTP Server gracefully restarted.", Colors.OKGREEN)
+        except subprocess.CalledProcessError as e:
+            print_colored(f"Failed to restart Apache: {e}", Colors.FAIL)
+            sys.exit(1)
+
+    def stop_apache(self, timeout=60):
+        """Stop Apache after in-flight requests finish, waiting up to timeout seconds."""
+        try:
+            subprocess.run(self.apache_command("-k", "stop" if self.os_type == "Windows" else "graceful-stop"), check=True)
+        except subprocess.CalledProcessError as e:
+            print_colored(f"Failed to stop Apache: {e}", Colors.FAIL)
+            sys.exit(1)
+        deadline = time.monotonic() + timeout
+        while self.is_running() and time.monotonic() < deadline:
+            time.sleep(0.5)
+
     def setup_environment_variables(self):
         """Set up system environment variables for Apache and PHP."""
         apache_bin_dir = os.path.join(self.apache_dir, "bin")
@@ -235,120 +1899,690 @@ class ApacheConfigurator:
             print_colored(f"Failed to set environment variables: {e}", Colors.FAIL)
             sys.exit(1)
 
+class PendingStage(Exception):
+    """Raised by a dry-run install at the first stage that would execute."""
+
+class InstallJournal:
+    """Persistent record of an install's settings and completed stages (with input digests)."""
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        self.settings = state.get("settings")
+        self.stages = state.get("stages", {})
+        self.finished = state.get("complete", False)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.tmp", "w") as f:
+            json.dump({"settings": self.settings, "stages": self.stages, "complete": self.finished}, f, indent=1)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    @staticmethod
+    def digest(inputs):
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+    def begin(self, settings):
+        self.settings = settings
+        self.finished = False
+        self.save()
+
+    def check(self, name, inputs, verify):
+        """Recorded outputs of a stage if it ran with these inputs and verify(outputs) still holds, else None."""
+        recorded = self.stages.get(name)
+        if not recorded or recorded["inputs"] != self.digest(inputs):
+            return None
+        try:
+            return recorded["outputs"] if verify(recorded["outputs"]) else None
+        except (OSError, KeyError, TypeError):
+            return None
+
+    def complete(self, name, inputs, outputs):
+        self.stages[name] = {"inputs": self.digest(inputs), "outputs": outputs, "completed": time.time()}
+        self.save()
+
+    def finish(self):
+        self.finished = True
+        self.save()
+
 class Installer:
-    def __init__(self):
+    def __init__(self, mirror=None, throttle=None, instance=None):
         self.os_type = platform.system()
         self.download_dir = os.path.join(os.path.expanduser("~"), "Downloads")
         self.install_dir = os.path.join("/", "usr", "local", "ApachePHP") if self.os_type != "Windows" else os.path.join(os.environ["SYSTEMDRIVE"], "ApachePHP")
-        self.apache_dir = os.path.join(self.install_dir, "Apache24")
-        self.php_dir = os.path.join(self.install_dir, "php")
-        self.downloader = Downloader()
-        self.pgp_handler = PGPHandler()
-        self.apache_configurator = ApacheConfigurator(self.apache_dir, self.php_dir, self.os_type)
+        # Named instances from a manifest are isolated under instances/<name>
+        self.instance = instance
+        if instance:
+            self.install_dir = os.path.join(self.install_dir, "instances", instance)
+        # Each Apache/PHP combination lives in releases/<apache>-<php>-<digest>; `current` points at the live one
+        self.releases_dir = os.path.join(self.install_dir, "releases")
+        self.auditor = InstallAuditor(self.install_dir)
+        self.current_link = os.path.join(self.install_dir, "current")
+        self.previous_link = os.path.join(self.install_dir, "previous")
+        self.apache_dir = os.path.join(self.current_link, "Apache24")
+        self.php_dir = os.path.join(self.current_link, "php")
+        self.downloader = Downloader(mirror, throttle)
+        self.pgp_handler = PGPHandler(self.downloader)
+        self.artifact_cache = ArtifactCache()
+        self.apache_configurator = ApacheConfigurator(self.apache_dir, self.php_dir, self.os_type,
+                                                      pid_file=os.path.join(self.install_dir, "run", "httpd.pid"))
 
     def get_user_input(self):
         print_colored("Cross-Platform Apache and PHP Installer", Colors.HEADER)
         print_colored("======================================", Colors.HEADER)
         
-        use_default_urls = input("Use default URLs for Apache and PHP? (y/n, default is 'y'): ") or "y"
-        
-        if use_default_urls.lower() == "y":
-            apache_url, php_url = default_apache_url, default_php_url
+        build_from_source = False
+        optimizations = []
+        if self.os_type == "Linux":
+            build_from_source = (input("Build Apache and PHP from source? (y/n, default is 'n'): ") or "n").lower() == "y"
+        if build_from_source:
+            apache_url, php_url = SOURCE_URLS["httpd"], SOURCE_URLS["php"]
+            choice = input("Extra build optimizations (none, lto, pgo or lto,pgo; default is 'none'): ") or "none"
+            optimizations = [o.strip() for o in choice.lower().split(",") if o.strip() in ("lto", "pgo")]
+        elif (input("Use default URLs for Apache and PHP? (y/n, default is 'y'): ") or "y").lower() == "y":
+            apache_url, php_url = DEFAULT_APACHE_URL, DEFAULT_PHP_URL
         else:
-            apache_url = input(f"Enter the download URL for Apache (default is {default_apache_url}): ") or default_apache_url
-            php_url = input(f"Enter the download URL for PHP (default is {default_php_url}): ") or default_php_url
+            apache_url = input(f"Enter the download URL for Apache (default is {DEFAULT_APACHE_URL}): ") or DEFAULT_APACHE_URL
+            php_url = input(f"Enter the download URL for PHP (default is {DEFAULT_PHP_URL}): ") or DEFAULT_PHP_URL
         
         apache_port = input("Enter the port for Apache to listen on (default is 8080): ") or "8080"
         document_root = input(f"Enter the DocumentRoot path for Apache (default is {os.path.join(self.apache_dir, 'htdocs')}): ") or os.path.join(self.apache_dir, 'htdocs')
         php_ini = input(f"Enter the path to php.ini (leave blank to use default in PHP directory): ") or os.path.join(self.php_dir, "php.ini")
+        static_profile = (input("Enable the static asset performance profile? (y/n, default is 'n'): ") or "n").lower() == "y"
+        prewarm = (input("Prewarm caches once Apache is running? (y/n, default is 'n'): ") or "n").lower() == "y"
+        php_mode = "module"
+        if self.os_type != "Windows":
+            php_mode = (input("Run PHP as an Apache module or with PHP-FPM? (module/fpm, default is 'module'): ") or "module").lower()
+        fpm_pm = "dynamic"
+        if php_mode == "fpm":
+            fpm_pm = (input("PHP-FPM process manager? (dynamic/ondemand, default is 'dynamic'): ") or "dynamic").lower()
         
-        return apache_url, php_url, apache_port, document_root, php_ini
+        return {
+            "apache_url": apache_url,
+            "php_url": php_url,
+            "apache_port": apache_port,
+            "document_root": document_root,
+            "php_ini": php_ini,
+            "static_profile": static_profile,
+            "prewarm": prewarm,
+            "php_mode": php_mode,
+            "fpm_pm": fpm_pm,
+            "build_from_source": build_from_source,
+            "optimizations": optimizations,
+        }
 
     def download_and_extract(self, url, extract_to, checksum_url=None, pgp_url=None, key_fingerprints=None):
-        """Download and extract a zip file from a URL, verifying checksum and PGP."""
+        """Download and extract a zip file or tarball from a URL, verifying checksum and PGP.
+
+        checksum_url may be a single checksum file URL or a list of them (e.g. a
+        .sha256 and a .sha512 file); all listed digests are checked in one pass.
+        Verified archives are extracted once into the artifact cache, and repeat
+        installs of the same URL are materialized from there without downloading.
+        """
+        digest = self.fetch_artifact(url, checksum_url, pgp_url, key_fingerprints)
+        self.artifact_cache.materialize(digest, extract_to)
+        return digest
+
+    def fetch_artifact(self, url, checksum_url=None, pgp_url=None, key_fingerprints=None, keyring_url=None):
+        """Download, verify and extract an archive into the artifact cache, returning its digest.
+
+        The signature must come from one of key_fingerprints (fetched from a keyserver)
+        or from a key in the project keyring at keyring_url.
+
+        Tarballs are extracted while they download (see stream_extract); zips need their
+        central directory, and Pythons without tarfile.data_filter cannot extract untrusted
+        tarballs safely, so both are downloaded to disk and verified first. Nothing enters the cache
+        before its checksums and signature have been verified.
+        """
+        cached_digest = self.artifact_cache.lookup(url)
+        if cached_digest:
+            print_colored(f"Using cached extraction of {os.path.basename(url)} ({cached_digest[:12]}).", Colors.OKBLUE)
+            return cached_digest
+
         filename = os.path.join(self.download_dir, os.path.basename(url))
+        # Streaming writes unverified members to disk, which is only safe with tarfile's data filter
+        compression = tar_compression(url) if hasattr(tarfile, "data_filter") else None
         
-        # Download the file
-        self.downloader.download_file(url, filename)
-        
-        # Verify download if checksum URL is provided
+        # Fetch the expected digests up front so every one is computed in the same pass
+        checksum_files = []
+        expected_checksums = {}
         if checksum_url:
-            print_colored("Verifying checksum...", Colors.OKCYAN)
-            checksum_file = os.path.join(self.download_dir, os.path.basename(checksum_url))
-            self.downloader.download_file(checksum_url, checksum_file)
-            
-            expected_checksum = None
-            with open(checksum_file, "r") as f:
-                for line in f:
-                    if os.path.basename(url) in line:
-                        expected_checksum = line.split()[0]
-                        break
-            
-            if expected_checksum is None:
+            for url_of_sums in ([checksum_url] if isinstance(checksum_url, str) else checksum_url):
+                checksum_file = os.path.join(self.download_dir, os.path.basename(url_of_sums))
+                self.downloader.download_file(url_of_sums, checksum_file)
+                checksum_files.append(checksum_file)
+
+                with open(checksum_file, "r") as f:
+                    for line in f:
+                        parts = line.split()
+                        # Accept both '<digest>  <file>' manifests and bare '<digest>' files
+                        if parts and (len(parts) == 1 or parts[-1].lstrip("*") == os.path.basename(url)):
+                            algorithm = guess_digest_algorithm(parts[0]) or guess_digest_algorithm(url_of_sums)
+                            if algorithm:
+                                expected_checksums[algorithm] = parts[0]
+                            break
+
+            if not expected_checksums:
                 print_colored(f"Error: Checksum for {os.path.basename(url)} not found.", Colors.FAIL)
                 sys.exit(1)
-            
-            if not self.downloader.verify_checksum(filename, expected_checksum):
-                sys.exit(1)
         
         # Download and import PGP keys if provided
-        if key_fingerprints:
-            for fingerprint in key_fingerprints:
-                self.pgp_handler.download_pgp_key(fingerprint)
-        
-        # Verify PGP signature if PGP URL is provided
+        signers = list(key_fingerprints or [])
+        for fingerprint in signers:
+            self.pgp_handler.download_pgp_key(fingerprint)
+        if keyring_url:
+            signers += self.pgp_handler.import_keyring(keyring_url)
         if pgp_url:
             pgp_file = os.path.join(self.download_dir, os.path.basename(pgp_url))
             self.downloader.download_file(pgp_url, pgp_file)
-            if not self.pgp_handler.verify_pgp(filename, pgp_file):
+
+        # Only an archive that is verified below may come from the (unauthenticated) mirror
+        via_mirror = bool(expected_checksums or pgp_url)
+        if self.downloader.mirror and not via_mirror:
+            print_colored(f"No checksum or signature to verify {os.path.basename(url)} against; "
+                          f"downloading it from upstream instead of the mirror.", Colors.WARNING)
+
+        if compression is None:
+            # Download the file
+            self.downloader.download_file(url, filename, via_mirror)
+            if expected_checksums:
+                print_colored("Verifying checksum...", Colors.OKCYAN)
+                if not self.downloader.verify_checksums(filename, expected_checksums):
+                    sys.exit(1)
+            if pgp_url and not self.pgp_handler.verify_pgp(filename, pgp_file, signers):
                 sys.exit(1)
-        
-        # Extract file
-        try:
-            print_colored(f"Extracting {filename}...", Colors.OKCYAN)
-            with zipfile.ZipFile(filename, 'r') as zip_ref:
-                zip_ref.extractall(extract_to)
-            print_colored(f"Extracted to {extract_to}", Colors.OKGREEN)
-        except zipfile.BadZipFile:
-            print_colored(f"Failed to extract {filename}. It may be corrupted.", Colors.FAIL)
-            sys.exit(1)
+
+            # Extract file into the artifact cache; install trees are materialized from there
+            try:
+                print_colored(f"Extracting {filename}...", Colors.OKCYAN)
+                digest = self.artifact_cache.extract(filename, url)
+                print_colored(f"Extracted to {self.artifact_cache.tree_path(digest)}", Colors.OKGREEN)
+            except (zipfile.BadZipFile, tarfile.TarError):
+                print_colored(f"Failed to extract {filename}. It may be corrupted.", Colors.FAIL)
+                sys.exit(1)
+        else:
+            digest = self.stream_artifact(url, compression, expected_checksums, filename if pgp_url else None, via_mirror)
+            if pgp_url and not self.pgp_handler.verify_pgp(filename, pgp_file, signers):
+                shutil.rmtree(self.artifact_cache.staging_path(), ignore_errors=True)
+                sys.exit(1)
+            self.artifact_cache.commit(self.artifact_cache.staging_path(), digest, url)
+            print_colored(f"Extracted to {self.artifact_cache.tree_path(digest)}", Colors.OKGREEN)
         
         # Clean up downloaded file and checksum file
-        os.remove(filename)
-        if checksum_url:
+        if os.path.exists(filename):
+            os.remove(filename)
+        for checksum_file in checksum_files:
             os.remove(checksum_file)
         if pgp_url:
             os.remove(pgp_file)
         print_colored(f"Cleaned up {filename}", Colors.OKGREEN)
+        return digest
 
-    def run(self):
-        apache_url, php_url, apache_port, document_root, php_ini = self.get_user_input()
-
-        # Check if Apache and PHP are already installed
-        if not os.path.exists(self.apache_dir) or not os.path.exists(self.php_dir):
-            # Download and install Apache with checksum and PGP verification
-            self.download_and_extract(apache_url, self.install_dir, checksum_url=None, pgp_url=None, key_fingerprints=[apache_pgp_key_url])
-            
-            # Download and install PHP with checksum and PGP verification
-            self.download_and_extract(php_url, self.install_dir, checksum_url=None, pgp_url=None, key_fingerprints=php_pgp_fingerprints)
+    def stream_artifact(self, url, compression, expected_checksums, tee_path=None, via_mirror=False):
+        """Download a tarball straight into the cache's staging directory and verify its digests.
+
+        The archive only touches the disk (as tee_path) when a PGP signature still has to be
+        checked against it. Returns the archive's SHA256.
+        """
+        staging = self.artifact_cache.staging_path()
+
+        def download():
+            shutil.rmtree(staging, ignore_errors=True)
+            hashes = {algorithm: hashlib.new(algorithm) for algorithm in set(expected_checksums) | {"sha256"}}
+            print_colored(f"Downloading and extracting {url}...", Colors.OKCYAN)
+            with self.downloader.urlopen(url, via_mirror) as response:
+                stream_extract(response, staging, compression, hashes, tee_path)
+            return hashes
+
+        hashes = self.downloader.retry(download)
+        if expected_checksums:
+            if not self.downloader.check_digests(os.path.basename(url), hashes, expected_checksums):
+                shutil.rmtree(staging, ignore_errors=True)
+                sys.exit(1)
+        return hashes["sha256"].hexdigest()
+
+    def instance_settings(self, spec):
+        """Complete an instance entry from a manifest with the defaults the interactive prompts use."""
+        settings = {
+            "apache_url": DEFAULT_APACHE_URL,
+            "php_url": DEFAULT_PHP_URL,
+            "apache_port": "8080",
+            "document_root": os.path.join(self.apache_dir, "htdocs"),
+            "php_ini": os.path.join(self.php_dir, "php.ini"),
+            "static_profile": False,
+            "prewarm": False,
+            "php_mode": "module",
+            "fpm_pm": "dynamic",
+            "build_from_source": False,
+            "optimizations": [],
+        }
+        settings.update({key: value for key, value in spec.items() if key != "name"})
+        settings["apache_port"] = str(settings["apache_port"])
+        if settings["build_from_source"]:
+            settings["apache_url"], settings["php_url"] = SOURCE_URLS["httpd"], SOURCE_URLS["php"]
+        return settings
+
+    def artifact_key(self, settings):
+        """What resolve_artifacts depends on; instances with the same key share one download and build."""
+        return (settings["apache_url"], settings["php_url"], bool(settings.get("build_from_source")),
+                tuple(sorted(settings.get("optimizations", []))))
+
+    def resolve_artifacts(self, settings):
+        """Fetch (or build) everything a release needs, returning (release_name, [(digest, subdir)])."""
+        apache_url, php_url = settings["apache_url"], settings["php_url"]
+        if settings.get("build_from_source"):
+            # Verified source tarballs, compiled into one cached tree holding Apache24/ and php/
+            source_digests = {}
+            for name, url in SOURCE_URLS.items():
+                # php.net publishes signatures but no checksum files next to its tarballs
+                checksum_url = None if name == "php" else f"{url}.sha256"
+                source_digests[name] = self.fetch_artifact(url, checksum_url=checksum_url, pgp_url=f"{url}.asc",
+                                                           keyring_url=SOURCE_KEYRINGS[name])
+            build_digest = SourceBuilder(self.artifact_cache, settings["optimizations"]).build(source_digests)
+            trees = [(build_digest, "")]
+            # A distinct Apache version component, so switching to or from a source build restarts httpd
+            release_name = f"{component_version(apache_url)}+src-{component_version(php_url)}-{build_digest[:12]}"
         else:
-            print_colored("Apache and PHP are already installed.", Colors.OKBLUE)
+            # Prebuilt binaries carry no signatures; verify whatever checksums their site publishes
+            apache_digest = self.fetch_artifact(apache_url, checksum_url=published_checksum_url(apache_url))
+            php_digest = self.fetch_artifact(php_url, checksum_url=published_checksum_url(php_url))
 
-        # Configure Apache to work with PHP, using the user-provided settings
-        self.apache_configurator.configure(apache_port, document_root, php_ini)
-        
-        # Set up environment variables
-        self.apache_configurator.setup_environment_variables()
-        
-        # Start Apache
-        self.apache_configurator.start_apache()
+            trees = [(apache_digest, ""), (php_digest, "php")]
+            combined_digest = hashlib.sha256(f"{apache_digest}:{php_digest}".encode()).hexdigest()[:12]
+            release_name = f"{component_version(apache_url)}-{component_version(php_url)}-{combined_digest}"
+        return release_name, trees
+
+    def materialize_release(self, release_name, trees):
+        """Assemble a release directory next to the live one from cached trees, returning its path."""
+        release_dir = os.path.join(self.releases_dir, release_name)
+        if os.path.isdir(release_dir):
+            print_colored(f"Release {release_name} is already installed.", Colors.OKBLUE)
+        else:
+            # Build under a temporary name so a failure never leaves a half-written release
+            staging_dir = os.path.join(self.releases_dir, f".{release_name}.tmp")
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            for digest, subdir in trees:
+                self.artifact_cache.materialize(digest, os.path.join(staging_dir, subdir))
+            os.replace(staging_dir, release_dir)
+            print_colored(f"Release {release_name} installed in {release_dir}.", Colors.OKGREEN)
+        return release_dir
+
+    def configure_release(self, settings, release_dir):
+        """Render the release's Apache (and PHP-FPM) configuration and return its digest.
+
+        Paths in the configuration go through `current`, so the file is valid once the release is live.
+        """
+        self.apache_configurator.configure(settings["apache_port"], settings["document_root"], settings["php_ini"],
+                                           httpd_conf=os.path.join(release_dir, "Apache24", "conf", "httpd.conf"),
+                                           static_profile=settings["static_profile"], php_mode=settings["php_mode"],
+                                           fpm_pm=settings.get("fpm_pm", "dynamic"))
+        return self.release_config_digest(release_dir)
+
+    def release_config_digest(self, release_dir):
+        sha256 = hashlib.sha256()
+        for name in ("httpd.conf", "php-fpm.conf"):
+            path = os.path.join(release_dir, "Apache24", "conf", name)
+            if os.path.exists(path):
+                with open(path, "rb") as conf_file:
+                    sha256.update(conf_file.read())
+        return sha256.hexdigest()
+
+    def path_exported(self):
+        """Whether the PATH export for this install is already in ~/.bash_profile."""
+        if self.os_type == "Windows":
+            return False  # Only the installer's own environment is changed there
+        try:
+            with open(os.path.expanduser("~/.bash_profile"), "r") as bash_file:
+                return os.path.join(self.apache_dir, "bin") in bash_file.read()
+        except OSError:
+            return False
+
+    def replace_link(self, link, target):
+        """Atomically repoint a directory link at target."""
+        temp_link = f"{link}.tmp-{os.getpid()}"
+        if os.path.lexists(temp_link):
+            self.remove_link(temp_link)
+        try:
+            os.symlink(target, temp_link, target_is_directory=True)
+        except OSError:
+            if self.os_type != "Windows":
+                raise
+            # Symlinks need Developer Mode or admin rights on Windows; junctions do not
+            import _winapi
+            _winapi.CreateJunction(target, temp_link)
+        try:
+            os.replace(temp_link, link)  # rename(2) over the old link is atomic on POSIX
+        except OSError:
+            # Windows cannot rename over an existing directory link
+            self.remove_link(link)
+            os.replace(temp_link, link)
+
+    def remove_link(self, link):
+        if self.os_type == "Windows":
+            os.rmdir(link)  # Removes a directory symlink or junction, never its target
+        else:
+            os.unlink(link)
+
+    def switch_release(self, release_dir):
+        """Make release_dir the live release and remember the one it replaces."""
+        previous_dir = os.path.realpath(self.current_link) if os.path.lexists(self.current_link) else None
+        self.replace_link(self.current_link, release_dir)
+        if previous_dir and previous_dir != os.path.realpath(release_dir):
+            self.replace_link(self.previous_link, previous_dir)
+        print_colored(f"Switched {self.current_link} to {os.path.basename(release_dir)}.", Colors.OKGREEN)
+        return previous_dir
+
+    def restart_onto_current(self, previous_dir, apache_port=None, php_ini=None):
+        """Move the running server onto the release `current` now points at."""
+        apache_port = apache_port or (self.apache_configurator.get_directive("Listen") or "80").rsplit(":", 1)[-1]
+        current_apache = os.path.basename(os.path.realpath(self.current_link)).split("-")[0]
+        previous_apache = os.path.basename(previous_dir or "").split("-")[0]
+        # Same httpd binary: a graceful restart picks up the new modules and config.
+        # A different httpd binary needs a new master process.
+        full_restart = bool(previous_dir) and current_apache != previous_apache
+        if full_restart and self.apache_configurator.is_running():
+            print_colored(f"Apache changes from {previous_apache} to {current_apache}; restarting the master process.", Colors.WARNING)
+        self.apache_configurator.reconcile(apache_port, php_ini, full_restart=full_restart)
+
+    def find_static_asset(self, document_root):
+        """URL path of a compressible asset under document_root to probe, or '/' if there is none."""
+        for root, _, files in os.walk(document_root):
+            for name in sorted(files):
+                if name.rsplit(".", 1)[-1] in PRECOMPRESSED_TYPES:
+                    relative = os.path.relpath(os.path.join(root, name), document_root)
+                    return "/" + relative.replace(os.sep, "/")
+        return "/"
+
+    def list_releases(self):
+        """Print installed releases, marking the current and previous ones."""
+        current_dir = os.path.realpath(self.current_link) if os.path.lexists(self.current_link) else None
+        previous_dir = os.path.realpath(self.previous_link) if os.path.lexists(self.previous_link) else None
+        releases = sorted(name for name in os.listdir(self.releases_dir) if not name.startswith(".")) if os.path.isdir(self.releases_dir) else []
+        for name in releases:
+            path = os.path.realpath(os.path.join(self.releases_dir, name))
+            marker = " (current)" if path == current_dir else " (previous)" if path == previous_dir else ""
+            print_colored(f"{name}{marker}", Colors.OKBLUE)
+        return releases
+
+    def rollback(self, release_name=None):
+        """Switch back to the previous release (or a named one) and restart onto it."""
+        if release_name:
+            release_dir = os.path.join(self.releases_dir, release_name)
+        elif os.path.lexists(self.previous_link):
+            release_dir = os.path.realpath(self.previous_link)
+        else:
+            release_dir = None
+        if not release_dir or not os.path.isdir(release_dir):
+            print_colored("No release to roll back to.", Colors.FAIL)
+            sys.exit(1)
+        previous_dir = self.switch_release(release_dir)
+        settings = InstallJournal(os.path.join(self.install_dir, "install-state.json")).settings or {}
+        self.restart_onto_current(previous_dir, php_ini=settings.get("php_ini"))
+        print_colored(f"Rolled back to {os.path.basename(release_dir)}.", Colors.OKGREEN)
+
+    def run(self):
+        journal = InstallJournal(os.path.join(self.install_dir, "install-state.json"))
+        if journal.settings and not journal.finished:
+            resume = input("The previous install did not finish. Resume it with the same settings? (y/n, default is 'y'): ") or "y"
+            if resume.lower() == "y":
+                return self.install(journal.settings)
+        self.install(self.get_user_input())
+
+    def install(self, settings, resolved=None, dry_run=False):
+        """Build, switch to and start a release for these settings; returns the release directory.
+
+        Each stage is recorded in the install journal with a digest of its inputs. A rerun
+        skips stages whose inputs are unchanged and whose outputs still check out, so it
+        resumes at the stage that failed. With dry_run nothing is changed; the returned
+        value is the plan as a list of (stage, action) pairs.
+        """
+        apache_port = settings["apache_port"]
+        journal = InstallJournal(os.path.join(self.install_dir, "install-state.json"))
+        if not dry_run:
+            journal.begin(settings)
+        plan = []
+
+        def stage(name, inputs, verify, action):
+            recorded = journal.check(name, inputs, verify)
+            if recorded is not None:
+                plan.append((name, "skip (done)"))
+                return recorded
+            if name not in journal.stages:
+                reason = "not done"
+            elif journal.stages[name]["inputs"] != journal.digest(inputs):
+                reason = "inputs changed"
+            else:
+                reason = "outputs missing or modified"
+            plan.append((name, f"run ({reason})"))
+            if dry_run:
+                raise PendingStage(name)
+            outputs = action()
+            journal.complete(name, inputs, outputs)
+            return outputs
+
+        try:
+            # Fetch and verify the artifacts (or reuse a resolution shared by several instances)
+            artifacts = stage("artifacts", self.artifact_key(settings),
+                              lambda out: all(os.path.isdir(self.artifact_cache.tree_path(d)) for d, _ in out["trees"]),
+                              lambda: dict(zip(("release_name", "trees"), resolved or self.resolve_artifacts(settings))))
+
+            # Build the new release while the current server keeps running
+            release = stage("release", artifacts,
+                            lambda out: os.path.isdir(out["release_dir"]),
+                            lambda: {"release_dir": self.materialize_release(artifacts["release_name"], artifacts["trees"])})
+            release_dir = release["release_dir"]
+
+            config_inputs = {key: settings.get(key) for key in ("apache_port", "document_root", "php_ini", "static_profile", "php_mode", "fpm_pm")}
+            config = stage("configure", dict(config_inputs, release_dir=release_dir),
+                           lambda out: self.release_config_digest(release_dir) == out["config_sha256"],
+                           lambda: {"config_sha256": self.configure_release(settings, release_dir)})
+
+            # Record what the release should contain so 'audit' can detect later drift
+            stage("manifest", dict(config, release_dir=release_dir),
+                  lambda out: os.path.exists(self.auditor.manifest_path(os.path.basename(release_dir))),
+                  lambda: {"files": len(self.auditor.record(release_dir))})
+
+            # Go live: swap `current` atomically, then move Apache onto it
+            switch = stage("switch", {"release_dir": release_dir},
+                           lambda out: os.path.realpath(self.current_link) == os.path.realpath(release_dir),
+                           lambda: {"previous_dir": self.switch_release(release_dir)})
+
+            # Set up environment variables (the host-wide PATH can only point at one instance)
+            if not self.instance:
+                stage("environment", {"apache_dir": self.apache_dir, "php_dir": self.php_dir},
+                      lambda out: self.path_exported(),
+                      lambda: self.apache_configurator.setup_environment_variables() or {})
+
+            # Start Apache, or reload it onto the new release if anything changed
+            stage("start", dict(config, release_dir=release_dir, apache_port=apache_port, php_ini=settings["php_ini"]),
+                  lambda out: (self.apache_configurator.applied_config_hash() == self.apache_configurator.config_hash(settings["php_ini"])
+                               and self.apache_configurator.is_running()),
+                  lambda: self.restart_onto_current(switch["previous_dir"], apache_port, settings["php_ini"]) or {})
+        except PendingStage as e:
+            # Later stages depend on what the first pending one produces
+            stages = ["artifacts", "release", "configure", "manifest", "switch"] + ([] if self.instance else ["environment"]) + ["start"]
+            plan += [(name, f"run (after {e.args[0]})") for name in stages[stages.index(e.args[0]) + 1:]]
+        if dry_run:
+            return plan
+
+        journal.finish()
+
+        # Confirm compression and caching headers are actually served
+        if settings["static_profile"]:
+            self.apache_configurator.check_static_profile(apache_port, self.find_static_asset(settings["document_root"]))
+
+        # Warm OPcache, the page cache and realpath caches before real users arrive
+        if settings.get("prewarm"):
+            Prewarmer(settings["document_root"], apache_port).run()
         
         print_colored(f"Setup complete! Apache with PHP is now running on http://localhost:{apache_port}", Colors.OKGREEN)
+        return release_dir
+
+    def plan(self):
+        """Show which install stages a rerun of the recorded install would execute."""
+        journal = InstallJournal(os.path.join(self.install_dir, "install-state.json"))
+        if not journal.settings:
+            print_colored("No install recorded yet; every stage would run.", Colors.WARNING)
+            return []
+        status = "complete" if journal.finished else "incomplete"
+        print_colored(f"Last install ({status}) on port {journal.settings['apache_port']}:", Colors.HEADER)
+        plan = self.install(journal.settings, dry_run=True)
+        for name, action in plan:
+            print_colored(f"  {name:<12} {action}", Colors.OKBLUE if action.startswith("skip") else Colors.WARNING)
+        return plan
+
+def load_manifest(manifest_path):
+    """Read the instance entries of a JSON or TOML manifest, checking names and ports are unique.
+
+    The manifest has an optional "defaults" table and an "instances" list; each instance
+    needs a "name" and takes the same keys as the interactive settings (apache_port,
+    document_root, php_url, php_mode, fpm_pm, ...).
+    """
+    with open(manifest_path, "rb") as f:
+        if manifest_path.endswith(".toml"):
+            if tomllib is None:
+                print_colored("TOML manifests need Python 3.11+; use JSON instead.", Colors.FAIL)
+                sys.exit(1)
+            manifest = tomllib.load(f)
+        else:
+            manifest = json.load(f)
+    defaults = manifest.get("defaults", {})
+    instances = [dict(defaults, **instance) for instance in manifest.get("instances", [])]
+    names = [instance.get("name") for instance in instances]
+    ports = [str(instance.get("apache_port")) for instance in instances]
+    if not instances:
+        print_colored(f"No instances defined in {manifest_path}.", Colors.FAIL)
+        sys.exit(1)
+    if not all(name and re.fullmatch(r"[A-Za-z0-9_-]+", name) for name in names) or len(set(names)) != len(names):
+        print_colored("Every instance needs a unique name made of letters, digits, '-' and '_'.", Colors.FAIL)
+        sys.exit(1)
+    if "None" in ports or len(set(ports)) != len(ports):
+        print_colored("Every instance needs its own apache_port.", Colors.FAIL)
+        sys.exit(1)
+    return instances
+
+def install_manifest(manifest_path, mirror=None, throttle=None, workers=None):
+    """Install every instance of a manifest: shared artifacts once, then all instances concurrently."""
+    if platform.system() == "Windows":
+        print_colored("Multi-instance manifests need Linux or MacOS (there is one Apache service on Windows).", Colors.FAIL)
+        sys.exit(1)
+    started = time.monotonic()
+    installers, settings = {}, {}
+    for spec in load_manifest(manifest_path):
+        installers[spec["name"]] = Installer(mirror, throttle, spec["name"])
+        settings[spec["name"]] = installers[spec["name"]].instance_settings(spec)
+
+    # Each distinct Apache/PHP combination is downloaded, verified (and built) once
+    resolved = {}
+    for name, instance_settings in settings.items():
+        key = installers[name].artifact_key(instance_settings)
+        if key not in resolved:
+            resolved[key] = installers[name].resolve_artifacts(instance_settings)
+    artifacts_done = time.monotonic()
+    print_colored(f"Resolved {len(resolved)} distinct release(s) for {len(settings)} instance(s) "
+                  f"in {artifacts_done - started:.1f}s.", Colors.OKGREEN)
+
+    def install_instance(name):
+        instance_start = time.monotonic()
+        try:
+            release_dir = installers[name].install(settings[name], resolved[installers[name].artifact_key(settings[name])])
+            return os.path.basename(release_dir), "ok", time.monotonic() - instance_start
+        except (Exception, SystemExit) as e:
+            # One broken instance must not take the others down
+            return None, f"failed ({e})" if str(e) not in ("", "1") else "failed", time.monotonic() - instance_start
+
+    with ThreadPoolExecutor(max_workers=workers or len(settings)) as pool:
+        results = dict(zip(settings, pool.map(install_instance, settings)))
+
+    print_colored("\nInstance summary", Colors.HEADER)
+    for name, (release, status, seconds) in results.items():
+        print_colored(f"  {name:<20} port {settings[name]['apache_port']:<6} {release or '-':<40} {status:<10} {seconds:6.1f}s",
+                      Colors.OKGREEN if status == "ok" else Colors.FAIL)
+    install_time = sum(seconds for _, _, seconds in results.values())
+    print_colored(f"Artifacts {artifacts_done - started:.1f}s, instances {time.monotonic() - artifacts_done:.1f}s wall "
+                  f"({install_time:.1f}s summed), {time.monotonic() - started:.1f}s total.", Colors.OKCYAN)
+    if any(status != "ok" for _, status, _ in results.values()):
+        sys.exit(1)
+    return results
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Cross-platform Apache and PHP installer.")
+    parser.add_argument("--instance", help="act on a named instance installed from a manifest")
+    parser.add_argument("--mirror", help="serve-cache URL to download verified archives through before going upstream (e.g. http://cache.lan:8090)")
+    parser.add_argument("--low-impact", action="store_true",
+                        help="run at low CPU/I/O priority and cap verification reads, backing off while the disk is busy")
+    parser.add_argument("--max-rate", type=float, default=LOW_IMPACT_MAX_RATE / (1024 * 1024), metavar="MB/S",
+                        help="read bandwidth cap for --low-impact (default: %(default).0f MB/s)")
+    subparsers = parser.add_subparsers(dest="command")
+    install_parser = subparsers.add_parser("install", help="install or upgrade Apache with PHP (default)")
+    install_parser.add_argument("--manifest", help="JSON/TOML manifest describing several instances to install non-interactively")
+    install_parser.add_argument("--jobs", type=int, help="instances configured and started concurrently (default: all)")
+    rollback_parser = subparsers.add_parser("rollback", help="switch back to the previous (or a named) release")
+    rollback_parser.add_argument("release", nargs="?", help="release name as shown by 'releases'")
+    subparsers.add_parser("releases", help="list installed releases")
+    subparsers.add_parser("plan", help="show which stages rerunning the last install would execute")
+    audit_parser = subparsers.add_parser("audit", help="check installed releases against the manifests recorded at install time")
+    audit_parser.add_argument("release", nargs="?", help="release name as shown by 'releases' (default: all)")
+    audit_parser.add_argument("--deep", action="store_true", help="hash every file instead of trusting unchanged metadata")
+    audit_parser.add_argument("--record", action="store_true", help="accept the current files and record a new manifest")
+    audit_parser.add_argument("--jobs", type=int, help="hashing processes (default: number of CPUs)")
+    precompress_parser = subparsers.add_parser("precompress", help="write .gz/.br sidecars for static assets in DocumentRoot")
+    precompress_parser.add_argument("--document-root", help="directory to process (default: DocumentRoot from httpd.conf)")
+    precompress_parser.add_argument("--jobs", type=int, help="worker processes (default: number of CPUs)")
+    prewarm_parser = subparsers.add_parser("prewarm", help="warm Apache/PHP caches before the node takes traffic")
+    prewarm_parser.add_argument("--document-root", help="directory to enumerate URLs from (default: DocumentRoot from httpd.conf)")
+    prewarm_parser.add_argument("--port", help="port Apache listens on (default: Listen from httpd.conf)")
+    prewarm_parser.add_argument("--urls", metavar="FILE_OR_URL", help="URL list (one per line) or sitemap.xml to request instead")
+    prewarm_parser.add_argument("--jobs", type=int, default=8, help="concurrent requests (default: 8)")
+    prewarm_parser.add_argument("--touch", action="store_true", help="also read DocumentRoot into the page cache first")
+    serve_parser = subparsers.add_parser("serve-cache", help="run a caching download proxy for other installers on the LAN")
+    serve_parser.add_argument("--bind", default="0.0.0.0", help="address to listen on (default: 0.0.0.0)")
+    serve_parser.add_argument("--port", type=int, default=8090, help="port to listen on (default: 8090)")
+    serve_parser.add_argument("--allow-host", action="append", default=[], help="additional upstream host to proxy")
+    return parser.parse_args()
 
 if __name__ == "__main__":
+    args = parse_args()
     try:
-        installer = Installer()
-        installer.run()
+        throttle = None
+        if args.low_impact:
+            _service_priority = lower_priority()
+            throttle = IOThrottle(args.max_rate * 1024 * 1024)
+        if args.command == "serve-cache":
+            CacheProxy(allowed_hosts=PROXY_ALLOWED_HOSTS + tuple(args.allow_host)).serve(args.bind, args.port)
+            sys.exit(0)
+        if getattr(args, "manifest", None):
+            install_manifest(args.manifest, args.mirror, throttle, args.jobs)
+            sys.exit(0)
+        installer = Installer(args.mirror, throttle, args.instance)
+        if args.command == "rollback":
+            installer.rollback(args.release)
+        elif args.command == "releases":
+            installer.list_releases()
+        elif args.command == "plan":
+            installer.plan()
+        elif args.command == "audit":
+            installer.auditor.workers = args.jobs
+            installer.auditor.run(args.release, deep=args.deep, record=args.record)
+        elif args.command == "precompress":
+            document_root = args.document_root or installer.apache_configurator.get_directive("DocumentRoot")
+            if not document_root:
+                print_colored("No DocumentRoot configured; pass --document-root.", Colors.FAIL)
+                sys.exit(1)
+            Precompressor(document_root, workers=args.jobs).run()
+        elif args.command == "prewarm":
+            document_root = args.document_root or installer.apache_configurator.get_directive("DocumentRoot")
+            if not document_root:
+                print_colored("No DocumentRoot configured; pass --document-root.", Colors.FAIL)
+                sys.exit(1)
+            apache_port = args.port or (installer.apache_configurator.get_directive("Listen") or "80").rsplit(":", 1)[-1]
+            Prewarmer(document_root, apache_port, workers=args.jobs).run(args.urls, touch=args.touch)
+        else:
+            installer.run()
     except Exception as e:
         print_colored(f"An unexpected error occurred: {e}", Colors.FAIL)
         sys.exit(1)
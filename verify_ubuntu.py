@@ -5,11 +5,29 @@ import requests
 import sys
 import os
 import re
+import json
+import time
+import queue
+import struct
+import sqlite3
+import threading
+import argparse
+import platform
 import subprocess
+import ctypes
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
 # Base URL templates for official Ubuntu releases
-BASE_URL = "https://releases.ubuntu.com/{version}/SHA256SUMS"
-GPG_URL = "https://releases.ubuntu.com/{version}/SHA256SUMS.gpg"
+SUMS_URL = "https://releases.ubuntu.com/{version}/{name}"
+GPG_URL = "https://releases.ubuntu.com/{version}/{name}.gpg"
+
+# Checksum manifests a release may publish, and the hashlib algorithm of each
+SUMS_FILES = {
+    "SHA256SUMS": "sha256",
+    "SHA512SUMS": "sha512",
+    "SHA1SUMS": "sha1",
+    "MD5SUMS": "md5",
+}
 
 # Ubuntu official GPG key IDs
 UBUNTU_GPG_KEYS = [
@@ -17,15 +35,210 @@ UBUNTU_GPG_KEYS = [
     "0xD94AA3F0EFE21092"  # Newer Ubuntu releases (like 22.04.2)
 ]
 
-def calculate_local_checksum(file_path):
-    """Calculate SHA256 checksum of the given ISO file."""
-    sha256_hash = hashlib.sha256()
+# Directory listing of current releases, used to discover versions to index
+RELEASES_URL = "https://releases.ubuntu.com/"
+
+# Local cache for the reverse checksum index and release metadata
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "verify_ubuntu")
+INDEX_DB = os.path.join(CACHE_DIR, "index.sqlite")
+RELEASE_CACHE_DIR = os.path.join(CACHE_DIR, "releases")
+
+# ISO download URL template, used to re-fetch corrupted byte ranges
+ISO_URL = "https://releases.ubuntu.com/{version}/{filename}"
+
+# Read size used when hashing, and number of buffers in the pipelined reader's ring
+READ_BLOCK_SIZE = 4 * 1024 * 1024
+PIPELINE_DEPTH = 4
+
+# ISO9660 logical sector size and location of the first volume descriptor
+ISO_SECTOR_SIZE = 2048
+ISO_FIRST_DESCRIPTOR_SECTOR = 16
+
+# Size of the blocks hashed into the block manifest (Merkle tree leaves)
+MANIFEST_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Low-impact mode: default read bandwidth cap, and the ioprio_set(2) syscall
+# (not wrapped by Python) used to move the process to the idle I/O class.
+# These and lower_priority()/IOThrottle are deliberately duplicated in
+# crossplatform_php_apache.py: each script is shipped and run on its own.
+LOW_IMPACT_MAX_RATE = 50 * 1024 * 1024
+IOPRIO_SYSCALLS = {"x86_64": 251, "aarch64": 30, "i686": 289, "armv7l": 314}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+
+def lower_priority():
+    """Run at nice 10 and, on Linux, in the idle I/O class so the node's services win any contention.
+
+    Threads and processes started afterwards inherit both settings. Returns the previous
+    (niceness, I/O priority) so they can be given back to processes that must not keep them.
+    """
+    niceness = ioprio = None
+    if hasattr(os, "nice"):
+        niceness = os.getpriority(os.PRIO_PROCESS, 0)
+        os.nice(10)
+    syscall_number = IOPRIO_SYSCALLS.get(platform.machine())
+    if platform.system() == "Linux" and syscall_number:
+        libc = ctypes.CDLL(None, use_errno=True)
+        ioprio = libc.syscall(syscall_number + 1, IOPRIO_WHO_PROCESS, 0)  # ioprio_get follows ioprio_set
+        if libc.syscall(syscall_number, IOPRIO_WHO_PROCESS, 0, IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT) != 0:
+            print(f"Could not lower the I/O priority: {os.strerror(ctypes.get_errno())}")
+            ioprio = None
+    return niceness, (ioprio if ioprio is not None and ioprio >= 0 else None)
+
+class IOThrottle:
+    """Token bucket capping read bandwidth, backing off while reads get slower than usual.
+
+    A rise in per-MB read latency means something else is using the disk, so the
+    rate drops towards min_rate; it recovers towards max_rate once reads are fast again.
+    Safe to share between reader threads.
+    """
+
+    def __init__(self, max_rate=LOW_IMPACT_MAX_RATE, min_rate=None):
+        self.max_rate = max_rate
+        self.min_rate = min_rate or max_rate / 16
+        self.rate = max_rate
+        self.tokens = 0.0
+        self.last = time.monotonic()
+        self.baseline = None  # Recent best per-MB read latency
+        self.latency = None   # Smoothed per-MB read latency
+        self.bytes = 0
+        self.read_time = 0.0
+        self.slept = 0.0
+        self.lock = threading.Lock()
+
+    def consume(self, nbytes, latency):
+        """Account for a read of nbytes that took latency seconds, sleeping to honour the rate."""
+        with self.lock:
+            self.bytes += nbytes
+            self.read_time += latency
+            if nbytes:
+                sample = latency * 1024 * 1024 / nbytes
+                # The baseline creeps up so one page-cache hit does not pin it forever
+                self.baseline = sample if self.baseline is None else min(sample, self.baseline * 1.05)
+                self.latency = sample if self.latency is None else 0.8 * self.latency + 0.2 * sample
+                if self.latency > 2 * self.baseline:
+                    self.rate = max(self.min_rate, self.rate * 0.7)
+                else:
+                    self.rate = min(self.max_rate, self.rate * 1.05)
+            now = time.monotonic()
+            self.tokens = min(self.tokens + (now - self.last) * self.rate, self.rate) - nbytes
+            self.last = now
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            if wait:
+                self.tokens = 0.0
+                self.last = now + wait
+                self.slept += wait
+        if wait:
+            time.sleep(wait)
+
+    def report(self, label):
+        """Print how much throttling slowed this work and how much disk read time it left to others.
+
+        The share left to others is the time spent yielding out of the time spent
+        reading plus yielding: the reads would otherwise have run back to back.
+        """
+        if not self.bytes:
+            return
+        throttled = self.read_time + self.slept
+        unthrottled = self.bytes / max(self.read_time, 1e-6)
+        print(f"Low-impact {label}: {self.bytes / (1024 * 1024):.0f} MB read at "
+              f"{self.bytes / max(throttled, 1e-6) / (1024 * 1024):.1f} MB/s (unthrottled reads: "
+              f"{unthrottled / (1024 * 1024):.1f} MB/s, final cap {self.rate / (1024 * 1024):.1f} MB/s), "
+              f"{self.slept:.1f}s spent yielding; ~{self.slept / max(throttled, 1e-6):.0%} of the disk's "
+              f"read time left to other processes.")
+
+def fadvise(f, offset, length, advice_name):
+    """Pass an access-pattern hint to the kernel where posix_fadvise is available."""
+    advice = getattr(os, advice_name, None)
+    if advice is None or not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        os.posix_fadvise(f.fileno(), offset, length, advice)
+    except OSError:
+        pass  # Not supported for this file (e.g. a pipe); the hint is optional
+
+def _pipelined_reader(f, free, filled, throttle=None):
+    """Reader thread: fill free buffers from the file and hand them to the hashing thread."""
+    offset = 0
+    try:
+        while True:
+            buf = free.get()
+            if buf is None:
+                break
+            read_start = time.monotonic()
+            n = f.readinto(buf)
+            if not n:
+                break
+            if throttle is not None:
+                throttle.consume(n, time.monotonic() - read_start)
+            filled.put((buf, n))
+            # The data now lives in our buffer; don't let it displace hot pages
+            fadvise(f, offset, n, "POSIX_FADV_DONTNEED")
+            offset += n
+    except Exception as e:
+        filled.put(e)
+    finally:
+        filled.put(None)
+
+def read_blocks(file_path, block_size=READ_BLOCK_SIZE, pipelined=False, depth=PIPELINE_DEPTH, throttle=None):
+    """Yield the file as a sequence of memoryviews of at most block_size bytes.
+
+    Each view is only valid until the next one is requested. In pipelined mode a
+    reader thread fills a ring of preallocated buffers while the caller hashes the
+    previous one, and the file is read with sequential/no-reuse cache hints. An
+    IOThrottle, if given, paces the reads.
+    """
+    with open(file_path, "rb", buffering=0) as f:
+        if not pipelined:
+            buf = bytearray(block_size)
+            view = memoryview(buf)
+            while True:
+                read_start = time.monotonic()
+                n = f.readinto(buf)
+                if not n:
+                    break
+                if throttle is not None:
+                    throttle.consume(n, time.monotonic() - read_start)
+                yield view[:n]
+            return
+
+        fadvise(f, 0, 0, "POSIX_FADV_SEQUENTIAL")
+        fadvise(f, 0, 0, "POSIX_FADV_NOREUSE")
+        free, filled = queue.Queue(), queue.Queue()
+        for _ in range(depth):
+            free.put(bytearray(block_size))
+        reader = threading.Thread(target=_pipelined_reader, args=(f, free, filled, throttle), daemon=True)
+        reader.start()
+        try:
+            while True:
+                item = filled.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                buf, n = item
+                yield memoryview(buf)[:n]
+                free.put(buf)
+        finally:
+            # Unblock the reader if the caller stopped early
+            free.put(None)
+            reader.join()
+
+def calculate_local_digests(file_path, algorithms, pipelined=False, abort=None, throttle=None):
+    """Calculate several digests of the given ISO file in a single read pass.
+
+    Returns None if the abort event is set before the hash completes.
+    """
+    hashes = {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
     try:
-        with open(file_path, "rb") as f:
-            # Read and update hash string value in blocks of 4MB
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        return sha256_hash.hexdigest()
+        # hashlib releases the GIL on large updates, so hashing overlaps the reader thread
+        for byte_block in read_blocks(file_path, pipelined=pipelined, throttle=throttle):
+            if abort is not None and abort.is_set():
+                return None
+            for digest in hashes.values():
+                digest.update(byte_block)
+        return {algorithm: digest.hexdigest() for algorithm, digest in hashes.items()}
     except FileNotFoundError:
         print(f"File not found: {file_path}")
         sys.exit(1)
@@ -40,31 +253,39 @@ def extract_ubuntu_version(file_name):
     if match:
         return match.group(1)  # Example: '22.04', '22.04.1', '22.04.2'
     else:
-        print("Error: Unable to extract Ubuntu version from filename.")
-        sys.exit(1)
+        # The caller can still identify the ISO by content via the index
+        return None
 
-def download_file(url, local_filename):
-    """Download a file from the given URL."""
-    try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        with open(local_filename, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        print(f"Downloaded: {local_filename}")
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to download {url}: {e}")
-        sys.exit(1)
+def parse_image_name(file_name):
+    """Split an image filename like 'ubuntu-22.04.2-live-server-amd64.iso' into (release, flavour, arch)."""
+    match = re.match(r"ubuntu-(\d{2}\.\d{2}(?:\.\d+)?)-(.+)-([^-]+?)\.[a-z]", file_name)
+    if match:
+        return match.groups()
+    return None, None, None
 
-def import_gpg_keys():
-    """Import all necessary Ubuntu GPG keys for verification."""
-    for key in UBUNTU_GPG_KEYS:
-        try:
-            # Import the GPG key if not already imported
-            subprocess.run(["gpg", "--keyserver", "keyserver.ubuntu.com", "--recv-keys", key], check=True)
-        except subprocess.CalledProcessError as e:
-            print(f"Error importing GPG key {key}: {e}")
-            sys.exit(1)
+_gpg_keys_lock = threading.Lock()
+_gpg_keys_imported = False
+
+def import_gpg_keys(prefetch=False):
+    """Import all necessary Ubuntu GPG keys for verification (once per run; safe to call from threads).
+
+    A prefetch runs ahead of need and fails silently; the real import retries and reports.
+    """
+    global _gpg_keys_imported
+    with _gpg_keys_lock:
+        if _gpg_keys_imported:
+            return
+        for key in UBUNTU_GPG_KEYS:
+            try:
+                # Import the GPG key if not already imported
+                subprocess.run(["gpg", "--keyserver", "keyserver.ubuntu.com", "--recv-keys", key], check=True,
+                               capture_output=prefetch)
+            except subprocess.CalledProcessError as e:
+                if prefetch:
+                    return
+                print(f"Error importing GPG key {key}: {e}")
+                sys.exit(1)
+        _gpg_keys_imported = True
 
 def verify_gpg_signature(checksum_file, gpg_file):
     """Verify the GPG signature of the checksum file."""
@@ -84,45 +305,612 @@ def verify_gpg_signature(checksum_file, gpg_file):
         print(f"Error during GPG verification: {e}")
         sys.exit(1)
 
-def fetch_and_verify_checksums(version):
-    """Fetch checksums and their GPG signature, and verify the signature."""
-    checksum_url = BASE_URL.format(version=version)
-    gpg_url = GPG_URL.format(version=version)
-    checksum_file = "SHA256SUMS"
-    gpg_file = "SHA256SUMS.gpg"
+def file_sha256(path):
+    """SHA256 of a small file, used to tie cached signature results to file contents."""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def load_release_meta(cache_dir):
+    """Load the cache metadata (validators and signature result) of a release."""
+    try:
+        with open(os.path.join(cache_dir, "meta.json"), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"files": {}, "signatures": {}}
+
+def save_release_meta(cache_dir, meta):
+    """Atomically save the cache metadata of a release."""
+    meta_path = os.path.join(cache_dir, "meta.json")
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(meta, f, indent=1)
+    os.replace(meta_path + ".tmp", meta_path)
 
-    # Download checksum file and GPG signature file
-    download_file(checksum_url, checksum_file)
-    download_file(gpg_url, gpg_file)
+def fetch_cached(url, local_path, validators):
+    """Revalidate a cached file against its URL.
 
-    # Verify the checksum file using GPG
-    verify_gpg_signature(checksum_file, gpg_file)
+    Returns True if new content was written, False on 304 and None on 404.
+    The validators dict (ETag/Last-Modified) is updated in place.
+    """
+    if not os.path.exists(local_path):
+        validators.clear()
+    response = conditional_get(url, validators.get("etag"), validators.get("last_modified"))
+    if response is None:
+        return None
+    if response.status_code == 304:
+        return False
+    with open(local_path + ".tmp", "wb") as f:
+        f.write(response.content)
+    os.replace(local_path + ".tmp", local_path)
+    validators["etag"] = response.headers.get("ETag")
+    validators["last_modified"] = response.headers.get("Last-Modified")
+    print(f"Downloaded: {url}")
+    return True
 
-    # Return the list of checksums
-    with open(checksum_file, 'r') as f:
-        return f.readlines()
+def fetch_release_checksums(version, name="SHA256SUMS"):
+    """Fetch (or revalidate) a release's checksum file and signature in its cache directory.
+
+    Returns (checksum_lines, changed), or None if the release does not publish this file.
+    """
+    cache_dir = os.path.join(RELEASE_CACHE_DIR, version)
+    os.makedirs(cache_dir, exist_ok=True)
+    meta = load_release_meta(cache_dir)
+    checksum_file = os.path.join(cache_dir, name)
+    gpg_file = os.path.join(cache_dir, name + ".gpg")
+    checksum_validators = meta["files"].setdefault(name, {})
+    gpg_validators = meta["files"].setdefault(name + ".gpg", {})
+
+    # Revalidate the checksum file and its signature concurrently
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        checksum_future = pool.submit(fetch_cached, SUMS_URL.format(version=version, name=name),
+                                      checksum_file, checksum_validators)
+        gpg_future = pool.submit(fetch_cached, GPG_URL.format(version=version, name=name),
+                                 gpg_file, gpg_validators)
+        checksum_changed, gpg_changed = checksum_future.result(), gpg_future.result()
+    if checksum_changed is None or gpg_changed is None:
+        return None
+
+    # Reuse the recorded signature result while both files are unchanged
+    digests = {"checksum_sha256": file_sha256(checksum_file), "signature_sha256": file_sha256(gpg_file)}
+    signatures = meta.setdefault("signatures", {})
+    signature = signatures.get(name)
+    if signature and signature.get("valid") and all(signature.get(k) == v for k, v in digests.items()):
+        print(f"{name} and signature unchanged; GPG signature previously verified.")
+    else:
+        signatures.pop(name, None)
+        save_release_meta(cache_dir, meta)
+        verify_gpg_signature(checksum_file, gpg_file)
+        signatures[name] = dict(digests, valid=True, verified=time.time())
+    save_release_meta(cache_dir, meta)
+
+    with open(checksum_file, "r") as f:
+        return f.readlines(), bool(checksum_changed or gpg_changed)
+
+def fetch_and_verify_checksums(version, name="SHA256SUMS"):
+    """Fetch checksums and their GPG signature, and verify the signature."""
+    result = fetch_release_checksums(version, name)
+    if result is None:
+        print(f"Error: no signed {name} published for Ubuntu {version}.")
+        sys.exit(1)
+    return result[0]
+
+def fetch_expected_digests(version, names, iso_filename):
+    """Collect {algorithm: digest} for the ISO from every requested manifest the release publishes."""
+    expected = {}
+    for name in names:
+        result = fetch_release_checksums(version, name)
+        if result is None:
+            print(f"Ubuntu {version} does not publish {name}, skipping.")
+            continue
+        digest = parse_checksum_lines(result[0]).get(iso_filename)
+        if digest is None:
+            print(f"{iso_filename} is not listed in {name}, skipping.")
+            continue
+        expected[SUMS_FILES[name]] = digest
+    if not expected:
+        print(f"Error: Checksum for {iso_filename} not found in fetched checksums.")
+        sys.exit(1)
+    return expected
+
+def parse_checksum_lines(lines):
+    """Parse '<digest> *<filename>' lines of a SUMS file into a {filename: digest} dict."""
+    checksums = {}
+    for line in lines:
+        parts = line.strip().split(None, 1)
+        if len(parts) != 2:
+            continue
+        digest, filename = parts
+        # A leading '*' marks binary mode in coreutils checksum output
+        checksums[filename.lstrip("*")] = digest.lower()
+    return checksums
 
 def find_checksum_in_list(lines, iso_filename):
     """Find the checksum for the specific ISO filename in the list of checksums."""
-    for line in lines:
-        if iso_filename in line:
-            return line.split()[0]  # The checksum should be the first element
+    checksum = parse_checksum_lines(lines).get(iso_filename)
+    if checksum:
+        return checksum
     print(f"Error: Checksum for {iso_filename} not found in fetched checksums.")
     sys.exit(1)
 
+def conditional_get(url, etag=None, last_modified=None):
+    """GET a URL, revalidating with If-None-Match/If-Modified-Since. Returns None on 404."""
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    try:
+        response = requests.get(url, headers=headers, timeout=30)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response
+    except requests.exceptions.RequestException as e:
+        print(f"Failed to fetch {url}: {e}")
+        sys.exit(1)
+
+def open_index(db_path=INDEX_DB):
+    """Open (creating if needed) the reverse checksum index database."""
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    db = sqlite3.connect(db_path)
+    db.executescript("""
+        CREATE TABLE IF NOT EXISTS checksums (
+            digest TEXT NOT NULL,
+            algorithm TEXT NOT NULL,
+            release TEXT NOT NULL,
+            flavour TEXT,
+            arch TEXT,
+            filename TEXT NOT NULL,
+            source TEXT NOT NULL,
+            PRIMARY KEY (source, filename, algorithm)
+        );
+        CREATE INDEX IF NOT EXISTS checksums_by_digest ON checksums (digest);
+        CREATE TABLE IF NOT EXISTS sources (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            updated REAL
+        );
+    """)
+    return db
+
+def discover_releases():
+    """List the release versions currently published on releases.ubuntu.com."""
+    response = conditional_get(RELEASES_URL)
+    if response is None:
+        return []
+    return sorted(set(re.findall(r'href="(\d{2}\.\d{2}(?:\.\d+)?)/"', response.text)))
+
+def update_index(db, versions):
+    """Add or refresh the signed SHA256SUMS of the given releases in the index."""
+    for version in versions:
+        checksum_url = SUMS_URL.format(version=version, name="SHA256SUMS")
+        result = fetch_release_checksums(version)
+        if result is None:
+            print(f"No signed SHA256SUMS published for Ubuntu {version}, skipping.")
+            continue
+        lines, changed = result
+        indexed = db.execute("SELECT 1 FROM sources WHERE url = ?", (checksum_url,)).fetchone()
+        if indexed and not changed:
+            print(f"Ubuntu {version}: unchanged.")
+            continue
+
+        validators = load_release_meta(os.path.join(RELEASE_CACHE_DIR, version))["files"]["SHA256SUMS"]
+        checksums = parse_checksum_lines(lines)
+        with db:
+            db.execute("DELETE FROM checksums WHERE source = ?", (checksum_url,))
+            for filename, digest in checksums.items():
+                release, flavour, arch = parse_image_name(filename)
+                db.execute("INSERT INTO checksums VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           (digest, "sha256", release or version, flavour, arch, filename, checksum_url))
+            db.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)",
+                       (checksum_url, validators.get("etag"), validators.get("last_modified"), time.time()))
+        print(f"Ubuntu {version}: indexed {len(checksums)} checksums.")
+
+def identify_by_digest(db, digest):
+    """Return (release, flavour, arch, filename, source) for every indexed file with this digest."""
+    return db.execute("SELECT release, flavour, arch, filename, source FROM checksums WHERE digest = ?",
+                      (digest.lower(),)).fetchall()
+
 def verify_checksum(local_checksum, remote_checksum):
     """Compare local checksum with the fetched remote checksum."""
     if local_checksum == remote_checksum:
         print(f"Checksum verification successful: {local_checksum}")
+        return True
     else:
         print(f"Checksum mismatch! Local: {local_checksum}, Remote: {remote_checksum}")
+        return False
+
+def hash_blocks(file_path, block_size=MANIFEST_BLOCK_SIZE, file_hash=None, throttle=None):
+    """Return the SHA256 digest of every fixed-size block of the file.
+
+    If file_hash is given, it is updated with the whole file in the same pass.
+    """
+    block_hashes = []
+    try:
+        for block in read_blocks(file_path, block_size, throttle=throttle):
+            block_hashes.append(hashlib.sha256(block).hexdigest())
+            if file_hash is not None:
+                file_hash.update(block)
+    except OSError as e:
+        print(f"Error hashing blocks of {file_path}: {e}")
+        sys.exit(1)
+    return block_hashes
+
+def merkle_root(block_hashes):
+    """Fold a list of block digests pairwise into a single Merkle root."""
+    level = [bytes.fromhex(h) for h in block_hashes] or [hashlib.sha256(b"").digest()]
+    while len(level) > 1:
+        # An odd node out is carried up unchanged to the next level
+        level = [hashlib.sha256(b"".join(level[i:i + 2])).digest() if i + 1 < len(level) else level[i]
+                 for i in range(0, len(level), 2)]
+    return level[0].hex()
+
+def build_block_manifest(file_path, block_size=MANIFEST_BLOCK_SIZE, throttle=None):
+    """Build a block manifest (block digests plus Merkle root) from a known-good ISO."""
+    file_hash = hashlib.sha256()
+    block_hashes = hash_blocks(file_path, block_size, file_hash, throttle)
+    return {
+        "filename": os.path.basename(file_path),
+        "size": os.path.getsize(file_path),
+        "sha256": file_hash.hexdigest(),
+        "block_size": block_size,
+        "root": merkle_root(block_hashes),
+        "blocks": block_hashes,
+    }
+
+def write_block_manifest(manifest, manifest_path):
+    """Save a block manifest as JSON."""
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    print(f"Block manifest written to {manifest_path} ({len(manifest['blocks'])} blocks, root {manifest['root']})")
+
+def load_block_manifest(manifest_path):
+    """Load a block manifest written by write_block_manifest."""
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error reading block manifest {manifest_path}: {e}")
+        sys.exit(1)
+    if merkle_root(manifest["blocks"]) != manifest["root"]:
+        print(f"Error: block manifest {manifest_path} is inconsistent with its Merkle root.")
+        sys.exit(1)
+    return manifest
+
+def find_corrupted_ranges(file_path, manifest, throttle=None):
+    """Compare the file against the manifest and return corrupted (start, end) byte ranges."""
+    block_size = manifest["block_size"]
+    size = manifest["size"]
+    local_hashes = hash_blocks(file_path, block_size, throttle=throttle)
+    if os.path.getsize(file_path) == size and merkle_root(local_hashes) == manifest["root"]:
+        return []
+
+    ranges = []
+    for index, expected in enumerate(manifest["blocks"]):
+        if index < len(local_hashes) and local_hashes[index] == expected:
+            continue
+        start = index * block_size
+        end = min(start + block_size, size) - 1
+        # Merge adjacent bad blocks so they can be fetched with a single request
+        if ranges and ranges[-1][1] + 1 == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+def repair_ranges(file_path, url, ranges, manifest):
+    """Re-fetch corrupted byte ranges via HTTP Range requests and write them in place."""
+    fetched = 0
+    with open(file_path, "r+b") as f:
+        # Drop any trailing garbage and make room for missing tail data
+        f.truncate(manifest["size"])
+        for start, end in ranges:
+            print(f"Re-fetching bytes {start}-{end} ({(end - start + 1) / (1024 * 1024):.1f} MB)...")
+            try:
+                response = requests.get(url, headers={"Range": f"bytes={start}-{end}"}, stream=True)
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                print(f"Failed to fetch range {start}-{end} from {url}: {e}")
+                sys.exit(1)
+            if response.status_code != 206:
+                print(f"Error: {url} does not support range requests (HTTP {response.status_code}).")
+                sys.exit(1)
+            f.seek(start)
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                f.write(chunk)
+                fetched += len(chunk)
+    print(f"Repaired {len(ranges)} range(s), {fetched / (1024 * 1024):.1f} MB fetched.")
+    return fetched
+
+def matches_signed_checksum(iso_file, remote_checksum, throttle=None):
+    """Re-hash the whole ISO; block hashes alone only vouch for what the manifest lists."""
+    print("Re-hashing the ISO against the signed SHA256...")
+    digests = calculate_local_digests(iso_file, ["sha256"], pipelined=True, throttle=throttle)
+    return digests["sha256"] == remote_checksum
+
+def localize_and_repair(iso_file, manifest_path, remote_checksum, repair_url=None, throttle=None):
+    """Pinpoint corrupted blocks using a block manifest and optionally repair them."""
+    manifest = load_block_manifest(manifest_path)
+    # Only trust a manifest built from an image matching the signed checksum
+    if manifest.get("sha256") != remote_checksum:
+        print(f"Error: block manifest {manifest_path} does not describe the signed image {remote_checksum}.")
+        sys.exit(1)
+    print("\nLocating corrupted blocks using the block manifest...")
+    ranges = find_corrupted_ranges(iso_file, manifest, throttle)
+    size = os.path.getsize(iso_file)
+    if size != manifest["size"]:
+        print(f"ISO is {size} bytes, the manifest expects {manifest['size']}.")
+    elif not ranges:
+        if matches_signed_checksum(iso_file, remote_checksum, throttle):
+            print("No corrupted blocks found; the ISO matches the signed SHA256.")
+            return True
+        # Every listed block matches, yet the ISO does not: the manifest is wrong
+        print("Error: the ISO matches the block manifest but not the signed SHA256; the manifest cannot be trusted.")
+        return False
+    for start, end in ranges:
+        print(f"Corrupted byte range: {start}-{end}")
+    if not repair_url:
+        return False
+
+    repair_ranges(iso_file, repair_url, ranges, manifest)
+    print("Re-verifying repaired ranges...")
+    remaining = find_corrupted_ranges(iso_file, manifest, throttle)
+    if remaining:
+        print(f"Repair incomplete, {len(remaining)} range(s) still corrupted.")
+        return False
+    if not matches_signed_checksum(iso_file, remote_checksum, throttle):
+        print("Repair failed; the repaired ISO still does not match the signed SHA256.")
+        return False
+    print("Repair successful; the ISO matches the signed SHA256.")
+    return True
+
+def parse_susp_entries(system_use, skip=0):
+    """Yield (signature, data) for each SUSP/Rock Ridge entry in a system use area."""
+    pos = skip
+    while pos + 4 <= len(system_use):
+        signature, length = system_use[pos:pos + 2], system_use[pos + 2]
+        if length < 4:
+            break
+        yield signature, system_use[pos + 4:pos + length]
+        pos += length
+
+def parse_directory_record(record, iso, susp_skip):
+    """Decode one ISO9660 directory record into (name, extent, size, flags)."""
+    extent, size = struct.unpack_from("<I", record, 2)[0], struct.unpack_from("<I", record, 10)[0]
+    flags, name_len = record[25], record[32]
+    raw_name = record[33:33 + name_len]
+    system_use = record[33 + name_len + (1 - name_len % 2):]
+
+    # Rock Ridge NM entries carry the real (long, case-preserving) name,
+    # possibly continued in a CE area elsewhere on the disc
+    rr_name = b""
+    # The SP skip only applies to the record's own system use field, not to CE areas
+    areas = [(system_use, susp_skip)]
+    while areas:
+        for signature, data in parse_susp_entries(*areas.pop()):
+            if signature == b"NM":
+                rr_name += data[1:]
+            elif signature == b"CE":
+                block, offset, length = (struct.unpack_from("<I", data, i)[0] for i in (0, 8, 16))
+                iso.seek(block * ISO_SECTOR_SIZE + offset)
+                areas.append((iso.read(length), 0))
+    if rr_name:
+        name = rr_name.decode("utf-8", "replace")
+    else:
+        # Plain ISO9660 name: strip the ';1' version and a trailing dot
+        name = raw_name.decode("ascii", "replace").split(";")[0].rstrip(".").lower()
+    return name, extent, size, flags
+
+def read_directory(iso, extent, size, susp_skip, joliet=False):
+    """Yield the decoded records of a directory extent, skipping '.' and '..'."""
+    iso.seek(extent * ISO_SECTOR_SIZE)
+    data = iso.read(size)
+    pos = 0
+    while pos < len(data):
+        length = data[pos]
+        if length == 0:
+            # Records never span sectors; zero padding up to the next one
+            pos = (pos // ISO_SECTOR_SIZE + 1) * ISO_SECTOR_SIZE
+            continue
+        record = data[pos:pos + length]
+        pos += length
+        if record[32] == 1 and record[33] in (0, 1):
+            continue
+        if joliet:
+            name_len = record[32]
+            name = record[33:33 + name_len].decode("utf-16-be", "replace").split(";")[0]
+            yield name, struct.unpack_from("<I", record, 2)[0], struct.unpack_from("<I", record, 10)[0], record[25]
+        else:
+            yield parse_directory_record(record, iso, susp_skip)
+
+def read_iso_tree(iso):
+    """Map every file path in an ISO9660 image to its list of (extent, size) pieces.
+
+    Names come from Rock Ridge when present, otherwise from a Joliet
+    supplementary descriptor, otherwise from the plain ISO9660 names.
+    """
+    primary_root, joliet_root = None, None
+    sector = ISO_FIRST_DESCRIPTOR_SECTOR
+    while True:
+        iso.seek(sector * ISO_SECTOR_SIZE)
+        descriptor = iso.read(ISO_SECTOR_SIZE)
+        if len(descriptor) < ISO_SECTOR_SIZE or descriptor[1:6] != b"CD001":
+            raise ValueError("not an ISO9660 image (no volume descriptor found)")
+        kind = descriptor[0]
+        if kind == 255:
+            break
+        if kind == 1:
+            primary_root = descriptor[156:156 + 34]
+        elif kind == 2 and descriptor[88:90] == b"%/" and descriptor[90:91] in (b"@", b"C", b"E"):
+            joliet_root = descriptor[156:156 + 34]
+        sector += 1
+    if primary_root is None:
+        raise ValueError("ISO9660 primary volume descriptor missing")
+
+    root_extent = struct.unpack_from("<I", primary_root, 2)[0]
+    root_size = struct.unpack_from("<I", primary_root, 10)[0]
+
+    # The root's '.' record tells us whether Rock Ridge is in use and its SUSP skip length
+    iso.seek(root_extent * ISO_SECTOR_SIZE)
+    dot = iso.read(ISO_SECTOR_SIZE)
+    dot = dot[:dot[0]]
+    susp_skip, has_rock_ridge = 0, False
+    for signature, data in parse_susp_entries(dot[34:]):
+        if signature == b"SP":
+            susp_skip = data[2]
+        if signature in (b"SP", b"PX", b"RR"):
+            has_rock_ridge = True
+
+    joliet = joliet_root is not None and not has_rock_ridge
+    if joliet:
+        root_extent = struct.unpack_from("<I", joliet_root, 2)[0]
+        root_size = struct.unpack_from("<I", joliet_root, 10)[0]
+
+    files = {}
+    pending = [("", root_extent, root_size)]
+    while pending:
+        prefix, extent, size = pending.pop()
+        for name, child_extent, child_size, flags in read_directory(iso, extent, size, susp_skip, joliet):
+            path = f"{prefix}{name}"
+            if flags & 0x02:
+                pending.append((path + "/", child_extent, child_size))
+            else:
+                # Files over 4 GB are stored as consecutive multi-extent records
+                files.setdefault(path, []).append((child_extent, child_size))
+    return files
+
+def read_iso_file(iso, extents):
+    """Read a whole (small) file from an open ISO image."""
+    data = b""
+    for extent, size in extents:
+        iso.seek(extent * ISO_SECTOR_SIZE)
+        data += iso.read(size)
+    return data
+
+def md5_iso_file(iso_path, path, extents):
+    """Worker: stream one contained file out of the image and return (path, md5, bytes)."""
+    md5 = hashlib.md5()
+    total = 0
+    with open(iso_path, "rb", buffering=0) as iso:
+        for extent, size in extents:
+            iso.seek(extent * ISO_SECTOR_SIZE)
+            remaining = size
+            while remaining:
+                chunk = iso.read(min(READ_BLOCK_SIZE, remaining))
+                if not chunk:
+                    raise IOError(f"unexpected end of image while reading {path}")
+                md5.update(chunk)
+                remaining -= len(chunk)
+                total += len(chunk)
+    return path, md5.hexdigest(), total
+
+def verify_iso_contents(iso_path, workers=None):
+    """Verify every file listed in the image's md5sum.txt, in parallel across processes."""
+    try:
+        with open(iso_path, "rb") as iso:
+            files = read_iso_tree(iso)
+            if "md5sum.txt" not in files:
+                print("Error: md5sum.txt not found in the image.")
+                return False
+            md5sums = read_iso_file(iso, files["md5sum.txt"]).decode("utf-8", "replace").splitlines()
+    except (OSError, ValueError) as e:
+        print(f"Error reading ISO9660 filesystem from {iso_path}: {e}")
+        return False
+
+    expected = {name[2:] if name.startswith("./") else name: digest
+                for name, digest in parse_checksum_lines(md5sums).items()}
+    # Without Rock Ridge or Joliet, names are only known case-insensitively
+    lowered = {name.lower(): extents for name, extents in files.items()}
+    for name in expected:
+        if name not in files and name.lower() in lowered:
+            files[name] = lowered[name.lower()]
+    missing = [name for name in expected if name not in files]
+    for name in missing:
+        print(f"MISSING: {name}")
+
+    # Largest files first so one big squashfs does not trail at the end
+    tasks = sorted((name for name in expected if name in files),
+                   key=lambda name: -sum(size for _, size in files[name]))
+    print(f"Verifying {len(tasks)} files listed in md5sum.txt...")
+    failures, total_bytes = [], 0
+    start = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(md5_iso_file, iso_path, name, files[name]) for name in tasks]
+        for future in as_completed(futures):
+            try:
+                name, digest, nbytes = future.result()
+            except OSError as e:
+                print(f"Error: {e}")
+                failures.append(str(e))
+                continue
+            total_bytes += nbytes
+            if digest != expected[name]:
+                print(f"FAILED: {name} (expected {expected[name]}, got {digest})")
+                failures.append(name)
+    elapsed = time.monotonic() - start
+
+    rate = total_bytes / (1024 * 1024) / max(elapsed, 1e-6)
+    print(f"Checked {len(tasks)} files, {total_bytes / (1024 * 1024):.1f} MB in {elapsed:.1f}s ({rate:.0f} MB/s).")
+    if failures or missing:
+        print(f"Content verification failed: {len(failures)} corrupted, {len(missing)} missing.")
+        return False
+    print("All files in md5sum.txt verified successfully.")
+    return True
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Verify an Ubuntu ISO against the signed SHA256SUMS.")
+    parser.add_argument("iso", nargs="?", help="path to the ISO file")
+    parser.add_argument("--index-update", nargs="*", metavar="VERSION",
+                        help="add/refresh releases in the local checksum index (default: all current releases)")
+    parser.add_argument("--identify", action="store_true",
+                        help="only identify the ISO by content using the local checksum index")
+    parser.add_argument("--sums", default="SHA256SUMS", metavar="NAMES",
+                        help="comma-separated checksum manifests to verify against, or 'all' "
+                             f"({', '.join(SUMS_FILES)}); every digest is computed in one pass")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="hash with a background reader thread and page-cache friendly read hints")
+    parser.add_argument("--low-impact", action="store_true",
+                        help="run at low CPU/I/O priority with a read bandwidth cap that backs off while the disk is busy")
+    parser.add_argument("--max-rate", type=float, default=LOW_IMPACT_MAX_RATE / (1024 * 1024), metavar="MB/S",
+                        help="read bandwidth cap for --low-impact (default: %(default).0f MB/s)")
+    parser.add_argument("--contents", action="store_true",
+                        help="verify the files inside the image (or a written USB device) against its md5sum.txt")
+    parser.add_argument("--jobs", type=int, metavar="N",
+                        help="worker processes for --contents (default: number of CPUs)")
+    parser.add_argument("--write-manifest", metavar="PATH",
+                        help="write a block manifest for this (known-good) ISO and exit")
+    parser.add_argument("--manifest", metavar="PATH",
+                        help="block manifest used to localize corruption on checksum mismatch")
+    parser.add_argument("--repair", action="store_true",
+                        help="re-fetch corrupted ranges over HTTP and re-verify (needs --manifest)")
+    parser.add_argument("--repair-url", metavar="URL",
+                        help="URL to re-fetch ranges from (default: the releases.ubuntu.com ISO URL)")
+    return parser.parse_args()
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python3 verify.py <path_to_iso>")
+    args = parse_args()
+    iso_file = args.iso
+    throttle = None
+    if args.low_impact:
+        # Worker threads and processes started below inherit the lowered priorities
+        lower_priority()
+        throttle = IOThrottle(args.max_rate * 1024 * 1024)
+
+    if args.index_update is not None:
+        db = open_index()
+        update_index(db, args.index_update or discover_releases())
+        if not iso_file:
+            return
+    if not iso_file:
+        print("Usage: python3 verify_ubuntu.py <path_to_iso>")
         sys.exit(1)
 
-    iso_file = sys.argv[1]
+    if args.contents:
+        # Block devices are fine here, e.g. a USB stick written from the ISO
+        if not os.path.exists(iso_file):
+            print(f"File '{iso_file}' does not exist.")
+            sys.exit(1)
+        sys.exit(0 if verify_iso_contents(iso_file, args.jobs) else 1)
 
     if not os.path.isfile(iso_file):
         print(f"File '{iso_file}' does not exist.")
@@ -131,22 +919,86 @@ def main():
     iso_filename = os.path.basename(iso_file)
     print(f"Detected ISO file: {iso_filename}")
 
+    if args.write_manifest:
+        print("Building block manifest...")
+        write_block_manifest(build_block_manifest(iso_file, throttle=throttle), args.write_manifest)
+        if throttle:
+            throttle.report("manifest build")
+        return
+
     print("Extracting Ubuntu version from filename...")
-    ubuntu_version = extract_ubuntu_version(iso_filename)
-    print(f"Detected Ubuntu version: {ubuntu_version}")
+    ubuntu_version = None if args.identify else extract_ubuntu_version(iso_filename)
+
+    sums_names = list(SUMS_FILES) if args.sums == "all" else [n.strip() for n in args.sums.split(",")]
+    unknown = [n for n in sums_names if n not in SUMS_FILES]
+    if unknown:
+        print(f"Error: unsupported checksum manifest(s): {', '.join(unknown)}")
+        sys.exit(1)
+    # SHA256 is always computed: it keys the checksum index and block manifests
+    algorithms = ["sha256"] + [SUMS_FILES[n] for n in sums_names if SUMS_FILES[n] != "sha256"]
+
+    print(f"Calculating local checksums ({', '.join(algorithms)}) for the ISO file...")
+    abort = threading.Event()
 
-    print("Calculating local checksum for the ISO file...")
-    local_checksum = calculate_local_checksum(iso_file)
-    print(f"Local checksum: {local_checksum}")
+    def hash_iso():
+        start = time.monotonic()
+        return calculate_local_digests(iso_file, algorithms, args.pipeline, abort, throttle), time.monotonic() - start
 
-    print(f"\nFetching and verifying remote checksums for Ubuntu {ubuntu_version}...")
-    remote_checksum_list = fetch_and_verify_checksums(ubuntu_version)
+    expected_digests = None
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        hash_future = pool.submit(hash_iso)
+        try:
+            if ubuntu_version is not None:
+                # Keys, checksum files and the signature check run while the ISO is hashed
+                print(f"Detected Ubuntu version: {ubuntu_version}")
+                pool.submit(import_gpg_keys, prefetch=True)
+                print(f"\nFetching and verifying remote checksums for Ubuntu {ubuntu_version}...")
+                expected_digests = fetch_expected_digests(ubuntu_version, sums_names, iso_filename)
+            local_digests, elapsed = hash_future.result()
+        finally:
+            # Stop hashing early if the metadata step bailed out (unlisted file, bad signature)
+            abort.set()
+    local_checksum = local_digests["sha256"]
+    print(f"Local checksum: {local_checksum} ({os.path.getsize(iso_file) / (1024 * 1024) / max(elapsed, 1e-6):.0f} MB/s)")
+    if throttle:
+        throttle.report("ISO hashing")
 
-    print("\nLooking for checksum matching the ISO file...")
-    remote_checksum = find_checksum_in_list(remote_checksum_list, iso_filename)
+    if ubuntu_version is None:
+        # Unknown or renamed ISO: identify it by content instead of by name
+        print("Identifying the ISO by content using the local checksum index...")
+        matches = identify_by_digest(open_index(), local_checksum)
+        if not matches:
+            print("Error: ISO not found in the checksum index (try --index-update).")
+            sys.exit(1)
+        for release, flavour, arch, filename, _ in matches:
+            print(f"Identified as {filename} (release {release}, flavour {flavour}, arch {arch})")
+        if args.identify:
+            return
+        # Verify against the release directory the checksum was indexed from
+        _, _, _, iso_filename, source = matches[0]
+        ubuntu_version = source.rstrip("/").split("/")[-2]
+        print(f"Detected Ubuntu version: {ubuntu_version}")
 
-    print("\nVerifying checksum...")
-    verify_checksum(local_checksum, remote_checksum)
+        print(f"\nFetching and verifying remote checksums for Ubuntu {ubuntu_version}...")
+        expected_digests = fetch_expected_digests(ubuntu_version, sums_names, iso_filename)
+
+    print("\nVerifying checksums...")
+    verified = True
+    for algorithm, remote_digest in expected_digests.items():
+        print(f"{algorithm.upper()}:")
+        verified = verify_checksum(local_digests[algorithm], remote_digest) and verified
+    if verified:
+        return
+
+    remote_checksum = expected_digests.get("sha256")
+    if args.manifest and remote_checksum:
+        repair_url = None
+        if args.repair:
+            repair_url = args.repair_url or ISO_URL.format(version=ubuntu_version, filename=iso_filename)
+        # A repaired ISO has been re-hashed against the signed checksum
+        if localize_and_repair(iso_file, args.manifest, remote_checksum, repair_url, throttle) and repair_url:
+            return
+    sys.exit(1)
 
 if __name__ == "__main__":
     main()